@@ -0,0 +1,81 @@
+"""Compare serial and parallel compression of a synthetic bundle, with and
+without precompressed siblings
+
+uv run python benchmarks/bench_bundle.py
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from metablock.bundle import write_zip
+from metablock.precompress import Precompress
+
+WORDS = (
+    "function const return import export default class extends async await "
+    "document window querySelector addEventListener fetch then catch"
+).split()
+
+
+def write_bundle(root: Path, files: int) -> int:
+    """Write JS, CSS and JSON assets of 1 to 60 KB"""
+    rng = random.Random(0)
+    words = rng.choices(WORDS, k=200_000)
+    source = " ".join(f"{word}{rng.randint(0, 999)}" for word in words)
+    size = 0
+    for index in range(files):
+        folder = root / f"chunk{index % 20}"
+        folder.mkdir(parents=True, exist_ok=True)
+        start = rng.randrange(len(source) // 2)
+        text = source[start : start + rng.randint(1_000, 60_000)]
+        path = folder / f"asset{index}.{('js', 'css', 'json')[index % 3]}"
+        path.write_text(text)
+        size += len(text)
+    return size
+
+
+def zip_seconds(
+    root: Path,
+    target: Path,
+    jobs: int,
+    repeat: int = 3,
+    precompress: Precompress | None = None,
+) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        write_zip(root, target, jobs, precompress=precompress)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    cpus = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "bundle"
+        size = write_bundle(root, 2000)
+        target = Path(tmp) / "bundle.zip"
+        print(f"\n2000 files, {size / 2**20:.0f} MiB, {cpus} CPUs")
+        serial = zip_seconds(root, target, 1)
+        print(
+            f"{'serial':>10}: {serial:6.2f} s, {target.stat().st_size / 2**20:.1f} MiB"
+        )
+        for jobs in sorted({2, 4, cpus} - {1}):
+            elapsed = zip_seconds(root, target, jobs)
+            print(f"{f'{jobs} jobs':>10}: {elapsed:6.2f} s ({serial / elapsed:4.1f}x)")
+        precompress = Precompress()
+        print(f"\nprecompressed {precompress.encodings}")
+        for jobs in sorted({1, cpus}):
+            elapsed = zip_seconds(root, target, jobs, 1, precompress)
+            print(
+                f"{f'{jobs} jobs':>10}: {elapsed:6.2f} s, "
+                f"{target.stat().st_size / 2**20:.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
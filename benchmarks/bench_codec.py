@@ -0,0 +1,53 @@
+"""Compare the JSON codecs on block list payloads
+
+uv run python benchmarks/bench_codec.py
+"""
+
+from __future__ import annotations
+
+import timeit
+from functools import partial
+from typing import Any, Callable
+
+from payloads import blocks
+
+from metablock.codec import CODECS, JsonCodec
+
+
+def codecs() -> list[JsonCodec]:
+    """Installed codecs, stdlib first as the baseline of the speedups"""
+    available = []
+    for codec in reversed(CODECS):
+        try:
+            available.append(codec())
+        except ImportError:
+            print(f"{codec.name}: not installed")
+    return available
+
+
+def best_ms(call: Callable[[], Any], number: int) -> float:
+    """Best time of one call in milliseconds"""
+    return min(timeit.repeat(call, number=number)) / number * 1000
+
+
+def main() -> None:
+    for size in (100, 1000):
+        payload = blocks(size)
+        body = JsonCodec().dumps(payload)
+        print(f"\n{size} blocks, {len(body) / 1024:.0f} KiB")
+        baseline = {}
+        for codec in codecs():
+            number = max(5000 // size, 3)
+            loads = best_ms(partial(codec.loads, body), number)
+            dumps = best_ms(partial(codec.dumps, payload), number)
+            baseline.setdefault("loads", loads)
+            baseline.setdefault("dumps", dumps)
+            print(
+                f"{codec.name:>8}: loads {loads:7.2f} ms "
+                f"({baseline['loads'] / loads:4.1f}x)  "
+                f"dumps {dumps:7.2f} ms ({baseline['dumps'] / dumps:4.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Compare validating 10k item list payloads per item and with a list adapter
+
+uv run python benchmarks/bench_models.py
+"""
+
+from __future__ import annotations
+
+import timeit
+from functools import partial
+from typing import Any, Callable
+
+from payloads import blocks, deployments
+from pydantic import BaseModel
+
+from metablock.components import list_adapter
+from metablock.schema import Block, Deployment
+
+SIZE = 10_000
+
+
+def adapter(model: type[BaseModel], data: list[dict]) -> list[BaseModel]:
+    """How managers build the models of list payloads"""
+    return list_adapter(model).validate_python(data)
+
+
+def per_item(model: type[BaseModel], data: list[dict]) -> list[BaseModel]:
+    return [model(**item) for item in data]
+
+
+def best_ms(call: Callable[[], Any], number: int = 3) -> float:
+    """Best time of one call in milliseconds"""
+    return min(timeit.repeat(call, number=number, repeat=3)) / number * 1000
+
+
+def main() -> None:
+    for model, data in ((Block, blocks(SIZE)), (Deployment, deployments(SIZE))):
+        print(f"\n{SIZE} {model.__name__} items")
+        baseline = 0.0
+        for build in (adapter, per_item):
+            elapsed = best_ms(partial(build, model, data))
+            baseline = baseline or elapsed
+            print(
+                f"{build.__name__:>12}: {elapsed:8.1f} ms ({baseline / elapsed:4.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare manifest rendering, serial and in worker processes
+
+uv run python benchmarks/bench_render.py
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable
+
+import jinja2
+import yaml
+
+from metablock.render import ManifestItem, environment, load_manifests
+
+ROUTE = """\
+  - name: route{index}
+    protocols:
+      - https
+    paths:
+      - /{{{{ block }}}}/{index}
+    methods:
+      - get
+      - post
+    tags:
+      - {{{{ space }}}}
+      - {{{{ block }}}}
+"""
+
+
+def write_manifests(directory: Path, count: int) -> list[ManifestItem]:
+    routes = "".join(ROUTE.format(index=index) for index in range(8))
+    text = f"upstream: https://{{{{ block }}}}.test\nroutes:\n{routes}"
+    items = []
+    for index in range(count):
+        path = directory / f"block{index}.yaml"
+        path.write_text(text)
+        items.append((path, dict(space="bench", block=path.stem)))
+    return items
+
+
+def fresh_environment(items: list[ManifestItem]) -> list[Any]:
+    """What apply did before: a new environment and the Python YAML loader"""
+    return [
+        yaml.safe_load(jinja2.Environment().from_string(path.read_text()).render(**p))
+        for path, p in items
+    ]
+
+
+def best_s(call: Callable[[], Any], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        environment.cache_clear()
+        start = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    cpus = os.cpu_count() or 1
+    for count in (1000, 3000):
+        with tempfile.TemporaryDirectory() as tmp:
+            items = write_manifests(Path(tmp), count)
+            print(f"\n{count} manifests, {cpus} CPUs")
+            baseline = best_s(partial(fresh_environment, items), repeat=1)
+            print(f"{'fresh environment':>20}: {baseline:6.2f} s")
+            for jobs in sorted({1, 2, cpus}):
+                elapsed = best_s(partial(load_manifests, items, jobs))
+                print(
+                    f"{f'cached, {jobs} jobs':>20}: {elapsed:6.2f} s "
+                    f"({baseline / elapsed:4.1f}x)"
+                )
+
+
+if __name__ == "__main__":
+    main()
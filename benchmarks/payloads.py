@@ -0,0 +1,73 @@
+"""Synthetic API payloads shaped like the live metablock responses"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+SPACE = {
+    "cdn": "cdn.metablock.io",
+    "cdn_id": "E2Q9S0NR1TQ3LM",
+    "hosted": True,
+    "name": "mblock",
+    "domain": "metablock.io",
+    "id": "0c6b8a9ad9f44c6d9bbf25a7a9c0d3e4",
+    "org_id": "5d1e4f2c7a8b4d1e9f0a3b6c8d2e1f4a",
+    "org_name": "metablock",
+}
+
+
+def route(index: int, block: str) -> dict[str, Any]:
+    return {
+        "id": f"{index:032x}",
+        "name": f"route-{index}",
+        "paths": [f"/{block}/v{index}", f"/{block}/api/v{index}"],
+        "methods": ["get", "post", "patch", "delete"],
+        "hosts": [f"{block}.metablock.io"],
+        "protocols": ["https"],
+        "plugins": [{"name": "cors", "config": {"origins": ["*"]}}],
+        "tags": ["mblock", block],
+        "strip_path": False,
+        "preserve_host": True,
+        "https_redirect_status_code": 301,
+    }
+
+
+def block(index: int, routes: int = 3) -> dict[str, Any]:
+    name = f"block-{index}"
+    return {
+        "id": f"{index:032x}",
+        "service_id": f"{index + 1:032x}",
+        "name": name,
+        "space": SPACE,
+        "api_url": f"https://api.metablock.io/v1/blocks/{index:032x}",
+        "full_name": f"mblock-{name}",
+        "html": index % 2 == 0,
+        "root": False,
+        "use_cdn": True,
+        "acme": False,
+        "domain": f"{name}.metablock.io",
+        "upstream": f"https://{name}.internal:8080",
+        "internal": {"replicas": 2, "region": "eu-west-1"},
+        "routes": [route(r, name) for r in range(routes)],
+        "url": f"https://{name}.metablock.io",
+    }
+
+
+def blocks(size: int) -> list[dict[str, Any]]:
+    return [block(index) for index in range(size)]
+
+
+def deployments(size: int) -> list[dict[str, Any]]:
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"{index:032x}",
+            "block_id": f"{index % 7:032x}",
+            "env": "prod" if index % 3 else "stage",
+            "created": (start + timedelta(minutes=index)).isoformat(),
+            "name": f"deployment {index}",
+            "url": f"https://cdn.metablock.io/deployments/{index:032x}.zip",
+        }
+        for index in range(size)
+    ]
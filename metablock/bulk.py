@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Generic, Iterable, TypeVar
+
+from typing_extensions import Annotated, Doc
+
+T = TypeVar("T")
+
+DEFAULT_CONCURRENCY = 10
+OVERLOAD_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+BulkCall = tuple[Any, Callable[[], Awaitable[T]]]
+
+
+@dataclass
+class AdaptiveConcurrency:
+    """Concurrency window adapted to the API load, additive increase and
+    multiplicative decrease (AIMD)
+
+    The window grows by one request for every window's worth of requests
+    completing with a flat latency, and shrinks by `decrease` when a request
+    is throttled (`429`), fails on the server (`5xx`) or on the network, or
+    takes more than `latency_tolerance` times the baseline latency. It
+    shrinks at most once per baseline latency, so a burst of failures from
+    one window only counts once. The baseline is a moving average of every
+    successful request, so a spike shrinks the window while a lasting change
+    in latency soon becomes the new baseline.
+
+    While a bulk operation runs, the client reports every HTTP attempt it
+    sends to the controller, retries included.
+    """
+
+    initial: Annotated[int, Doc("Starting window")] = 4
+    minimum: Annotated[int, Doc("Smallest window")] = 1
+    maximum: Annotated[int, Doc("Largest window")] = 64
+    decrease: Annotated[float, Doc("Factor shrinking the window on overload")] = 0.5
+    latency_tolerance: Annotated[
+        float, Doc("Latency over the baseline, as a ratio, counted as overload")
+    ] = 2.0
+    window: float = field(init=False)
+    latency: float = field(init=False, default=0.0)
+    in_flight: int = field(init=False, default=0)
+    increases: int = field(init=False, default=0)
+    decreases: int = field(init=False, default=0)
+    last_decrease: float = field(init=False, default=0.0)
+    changed: asyncio.Condition = field(init=False, default_factory=asyncio.Condition)
+
+    def __post_init__(self) -> None:
+        self.window = float(self.initial)
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed in flight"""
+        return max(self.minimum, min(self.maximum, int(self.window)))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait until the window has room for one more operation"""
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self.changed:
+                self.in_flight -= 1
+                self.changed.notify_all()
+
+    def observe(self, latency: float, status: int = 0) -> None:
+        """Record an HTTP attempt, `status` is 0 when it failed on the network"""
+        if not status or status in OVERLOAD_STATUSES:
+            self.overload()
+            return
+        slow = self.latency and latency > self.latency * self.latency_tolerance
+        self.latency = 0.9 * self.latency + 0.1 * latency if self.latency else latency
+        if slow:
+            self.overload()
+        elif self.window < self.maximum:
+            self.window = min(self.maximum, self.window + 1 / self.limit)
+            self.increases += 1
+
+    def overload(self) -> None:
+        now = time.monotonic()
+        if now - self.last_decrease < self.latency:
+            return
+        self.last_decrease = now
+        self.window = max(self.minimum, self.window * self.decrease)
+        self.decreases += 1
+
+
+# the controller of the bulk operation running in the current task, if any
+bulk_controller: ContextVar[AdaptiveConcurrency | None] = ContextVar(
+    "bulk_controller", default=None
+)
+
+
+@dataclass
+class BulkResult(Generic[T]):
+    """Outcome of one operation of a bulk request
+
+    `key` identifies the operation, such as the block id it acted upon, and
+    exactly one of `value` and `error` is set.
+    """
+
+    key: Any
+    value: T | None = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def run_bulk(
+    calls: Iterable[BulkCall[T]],
+    concurrency: int | AdaptiveConcurrency = DEFAULT_CONCURRENCY,
+) -> list[BulkResult[T]]:
+    """Run `calls` with at most `concurrency` in flight
+
+    `concurrency` is either a fixed number or an adaptive controller. Results
+    are returned in the order of `calls`. A failing call is recorded in its
+    result and does not stop the others.
+    """
+    pending = list(calls)
+    results: list[BulkResult[T]] = [BulkResult(key) for key, _ in pending]
+    queue = iter(enumerate(pending))
+    controller: AdaptiveConcurrency | None = None
+    if isinstance(concurrency, AdaptiveConcurrency):
+        controller, workers = concurrency, concurrency.maximum
+    else:
+        workers = concurrency
+
+    async def run(index: int, call: Callable[[], Awaitable[T]]) -> None:
+        try:
+            results[index].value = await call()
+        except Exception as exc:
+            results[index].error = exc
+
+    async def worker() -> None:
+        if controller is None:
+            for index, (_, call) in queue:
+                await run(index, call)
+            return
+        while True:
+            async with controller.slot():
+                item = next(queue, None)
+                if item is None:
+                    return
+                index, (_, call) = item
+                await run(index, call)
+
+    token = bulk_controller.set(controller)
+    try:
+        workers = min(max(workers, 1), len(pending))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        bulk_controller.reset(token)
+    return results
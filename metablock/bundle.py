@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import cache
+from pathlib import Path
+from typing import IO, AsyncIterator, Sequence
+
+from typing_extensions import Annotated, Doc
+
+from .precompress import Precompress, Variant
+from .upload import CHUNK_SIZE
+
+# chunks of the zip held in memory while waiting for the upload
+BUFFER_CHUNKS = 8
+
+
+class StreamAbortedError(Exception):
+    """The consumer of a zip stream stopped before the end"""
+
+
+# already compressed formats, deflating them costs time for no gain
+STORED_SUFFIXES = frozenset(
+    (".woff", ".woff2", ".zip", ".gz", ".tgz", ".br", ".zst", ".xz", ".bz2", ".7z")
+)
+STORED_TYPES = ("image/", "video/", "audio/")
+# media types which are text or uncompressed, deflated despite the above
+DEFLATED_TYPES = frozenset(("image/svg+xml", "image/bmp", "image/x-icon"))
+# timestamp of every archive entry, the earliest a zip can hold
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+# file in the bundle directory listing what to leave out of the bundle
+IGNORE_FILE = ".metablockignore"
+# left out of every bundle, unless a later pattern includes them again
+DEFAULT_IGNORE = (".DS_Store", "Thumbs.db", IGNORE_FILE)
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+# deployments have no metadata, their name records the hash of the bundle
+HASH_PREFIX = "sha256:"
+
+
+@dataclass
+class CompressionPolicy:
+    """How the files of a bundle are compressed, by content type
+
+    Images, video, audio, web fonts and archives are stored as they are, since
+    their formats are compressed already; other files are deflated at `level`.
+    """
+
+    level: Annotated[int, Doc("Deflate level, from 1 (fastest) to 9 (smallest)")] = 6
+    stored_suffixes: Annotated[
+        frozenset[str], Doc("File suffixes stored without compression")
+    ] = STORED_SUFFIXES
+    stored_types: Annotated[
+        tuple[str, ...], Doc("Media type prefixes stored without compression")
+    ] = STORED_TYPES
+
+    def compress_type(self, path: Path) -> int:
+        """The zip compression of the file at `path`"""
+        suffix = path.suffix.lower()
+        if suffix in self.stored_suffixes:
+            return zipfile.ZIP_STORED
+        media_type = mimetypes.guess_type(path.name)[0] or ""
+        if media_type.startswith(self.stored_types) and (
+            media_type not in DEFLATED_TYPES
+        ):
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+
+@dataclass
+class IgnoreRules:
+    """Which files of a directory are left out of its bundle
+
+    Patterns work as in `.gitignore`: one without a slash matches the name of
+    a file or of any directory above it, one with a slash at the start or in
+    the middle matches the path from the bundle root, a trailing slash only
+    matches directories and a leading `!` includes again what an earlier
+    pattern left out. `*` and `?` do not match a slash, `**/` matches zero
+    or more directories. The last matching pattern wins. Blank lines and `#`
+    comments are skipped.
+    """
+
+    patterns: Annotated[tuple[str, ...], Doc("Patterns, in the order they apply")] = (
+        DEFAULT_IGNORE
+    )
+
+    @classmethod
+    def load(cls, path: Path, patterns: Sequence[str] = ()) -> IgnoreRules:
+        """The default rules, then those of the `.metablockignore` file of
+        directory `path`, then `patterns`"""
+        file = path / IGNORE_FILE
+        lines = file.read_text().splitlines() if file.is_file() else []
+        return cls((*DEFAULT_IGNORE, *lines, *patterns))
+
+    def ignored(self, name: str) -> bool:
+        """Whether the file at `name`, relative to the bundle root, is left out"""
+        ignored = False
+        for line in self.patterns:
+            pattern = line.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            include = pattern.startswith("!")
+            if match_pattern(pattern.removeprefix("!"), name):
+                ignored = not include
+        return ignored
+
+
+def match_pattern(pattern: str, name: str) -> bool:
+    return pattern_regex(pattern).fullmatch(name) is not None
+
+
+@cache
+def pattern_regex(pattern: str) -> re.Pattern[str]:
+    """The regex matching the file paths an ignore pattern leaves out"""
+    directory = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    # a slash at the start or in the middle anchors the pattern to the root
+    prefix = "" if "/" in pattern else "(?:.*/)?"
+    # a pattern matches a file or any directory above it, but a directory
+    # pattern only matches directories
+    suffix = "/.*" if directory else "(?:/.*)?"
+    return re.compile(prefix + translate_pattern(pattern.removeprefix("/")) + suffix)
+
+
+def translate_pattern(pattern: str) -> str:
+    regex = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        at_start = index == 0 or pattern[index - 1] == "/"
+        if at_start and pattern.startswith("**/", index):
+            # zero or more directories
+            regex.append("(?:.*/)?")
+            index += 3
+            continue
+        if at_start and pattern[index:] == "**":
+            regex.append(".*")
+            break
+        if char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[" and (end := pattern.find("]", index + 2)) > 0:
+            chars = pattern[index + 1 : end].replace("\\", "\\\\")
+            if chars.startswith("!"):
+                chars = f"^{chars[1:]}"
+            regex.append(f"[{chars}]")
+            index = end
+        else:
+            regex.append(re.escape(char))
+        index += 1
+    return "".join(regex)
+
+
+@dataclass
+class TypeStats:
+    """Compression of the files of one type in a bundle"""
+
+    files: int = 0
+    size: int = 0
+    compressed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def saved(self) -> int:
+        return self.size - self.compressed
+
+
+@dataclass
+class BundleStats:
+    """Bytes saved and time spent compressing a bundle, by file suffix"""
+
+    types: dict[str, TypeStats] = field(default_factory=dict)
+
+    def add(self, info: zipfile.ZipInfo, seconds: float) -> None:
+        stats = self.types.setdefault(
+            Path(info.filename).suffix.lower() or "(none)", TypeStats()
+        )
+        stats.files += 1
+        stats.size += info.file_size
+        stats.compressed += info.compress_size
+        stats.seconds += seconds
+
+    def report(self) -> list[str]:
+        """One line per type, the most bytes saved first"""
+        return [
+            f"{suffix}: {stats.files} files, {format_size(stats.size)} -> "
+            f"{format_size(stats.compressed)}, saved {format_size(stats.saved)} "
+            f"in {stats.seconds:.2f}s"
+            for suffix, stats in sorted(
+                self.types.items(), key=lambda item: item[1].saved, reverse=True
+            )
+        ]
+
+
+def parse_size(value: str) -> int:
+    """Bytes of a size such as `800K`, `20MiB` or `1.5g`, in powers of 1024"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?", value.strip().lower())
+    if not match:
+        raise ValueError(f"invalid size {value!r}")
+    return int(float(match[1]) * SIZE_UNITS[match[2]])
+
+
+def format_size(size: int) -> str:
+    value = float(size)
+    for unit in ("B", "KiB", "MiB"):
+        if abs(value) < 1024:
+            return f"{size} B" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GiB"
+
+
+def write_zip(
+    path: Path,
+    file: str | Path | IO[bytes],
+    jobs: int = 1,
+    policy: CompressionPolicy | None = None,
+    stats: BundleStats | None = None,
+    ignore: IgnoreRules | None = None,
+    precompress: Precompress | None = None,
+) -> BundleStats:
+    """Zip the files of directory `path` into `file`
+
+    Files are compressed according to `policy`, and `stats` records the bytes
+    saved and the time spent for each type of file. With `jobs` above 1,
+    files are deflated concurrently in a pool of threads, zlib releasing the
+    GIL while it compresses, and the deflated entries are added to the
+    archive in order. Files are read in chunks, and up to twice `jobs`
+    deflated entries are held in memory. With `jobs` set to 0 a thread per
+    CPU is used. The `precompress` siblings of text assets are encoded in the
+    same threads and stored next to them.
+
+    The archive is reproducible: entries are sorted and carry a fixed
+    timestamp and permissions, so the same tree always zips to the same bytes.
+    Files matching `ignore`, by default the rules of the `.metablockignore`
+    file of `path`, are left out, as are directories, which unzip anyway.
+    """
+    policy = policy or CompressionPolicy()
+    stats = stats if stats is not None else BundleStats()
+    jobs = jobs or os.cpu_count() or 1
+    entries = bundle_entries(path, ignore)
+    with zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED) as zipf:
+        if jobs < 2:
+            for entry in entries:
+                compressed = compress_entry(entry, policy, precompress)
+                add_entry(zipf, path, entry, compressed, stats)
+            return stats
+        with ThreadPoolExecutor(jobs) as pool:
+            pending: deque[tuple[Path, Future[Compressed]]] = deque()
+            for entry in entries:
+                future = pool.submit(compress_entry, entry, policy, precompress)
+                pending.append((entry, future))
+                if len(pending) >= 2 * jobs:
+                    add_pending(zipf, path, pending, stats)
+            while pending:
+                add_pending(zipf, path, pending, stats)
+    return stats
+
+
+def bundle_entries(path: Path, ignore: IgnoreRules | None = None) -> list[Path]:
+    """Files under `path` not matching `ignore`, in archive order"""
+    rules = ignore or IgnoreRules.load(path)
+    return sorted(
+        entry
+        for entry in path.rglob("*")
+        if entry.is_file() and not rules.ignored(entry.relative_to(path).as_posix())
+    )
+
+
+def file_sizes(path: Path, ignore: IgnoreRules | None = None) -> dict[str, int]:
+    """Size of the files of the bundle of `path`, by name"""
+    return {
+        entry.relative_to(path).as_posix(): entry.stat().st_size
+        for entry in bundle_entries(path, ignore)
+    }
+
+
+def is_deflated(entry: Path, policy: CompressionPolicy) -> bool:
+    return policy.compress_type(entry) == zipfile.ZIP_DEFLATED
+
+
+def zip_info(root: Path, entry: Path) -> zipfile.ZipInfo:
+    """Archive entry of `entry`, independent of when and by whom it was written
+
+    Only the executable bit of the file mode is kept.
+    """
+    return archive_info(
+        entry.relative_to(root).as_posix(), bool(entry.stat().st_mode & 0o111)
+    )
+
+
+def archive_info(name: str, executable: bool = False) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, ZIP_EPOCH)
+    info.external_attr = (0o100755 if executable else 0o100644) << 16
+    info.create_system = 3
+    return info
+
+
+def tree_hash(
+    path: Path,
+    ignore: IgnoreRules | None = None,
+    precompress: Precompress | None = None,
+) -> str:
+    """Content hash of the bundle of directory `path`
+
+    It covers the name, executable bit and content of every file, and the
+    `precompress` settings, which is what ends up in the archive, and not
+    how the archive is compressed.
+    """
+    digest = hashlib.sha256()
+    if precompress:
+        digest.update(f"{precompress.fingerprint()}\0".encode())
+    for entry in bundle_entries(path, ignore):
+        info = zip_info(path, entry)
+        digest.update(f"{info.filename}\0{info.external_attr}\0".encode())
+        with entry.open("rb") as file:
+            digest.update(hashlib.file_digest(file, "sha256").digest())
+    return digest.hexdigest()
+
+
+def deployment_name(name: str, digest: str) -> str:
+    """Deployment `name` recording the tree hash `digest` of its bundle"""
+    return f"{name} {HASH_PREFIX}{digest}".lstrip()
+
+
+def deployment_hash(name: str | None) -> str:
+    """Tree hash recorded in a deployment name, empty if there is none"""
+    tag = (name or "").rpartition(" ")[2]
+    return tag.removeprefix(HASH_PREFIX) if tag.startswith(HASH_PREFIX) else ""
+
+
+# the raw deflate stream of a file, in chunks, with the CRC and size of its
+# content and the seconds taken
+Deflated = tuple[list[bytes], int, int, float]
+# an entry, deflated unless it is stored, and its precompressed siblings
+Compressed = tuple[Deflated | None, list[Variant]]
+
+
+def compress_entry(
+    entry: Path, policy: CompressionPolicy, precompress: Precompress | None
+) -> Compressed:
+    deflated = deflate(entry, policy.level) if is_deflated(entry, policy) else None
+    return deflated, precompress.variants(entry) if precompress else []
+
+
+def deflate(file: Path, level: int = zlib.Z_DEFAULT_COMPRESSION) -> Deflated:
+    """Deflate a file, read in chunks so only its deflated content is held in
+    memory"""
+    start = time.perf_counter()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = []
+    crc = size = 0
+    with file.open("rb") as source:
+        while chunk := source.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            if data := compressor.compress(chunk):
+                deflated.append(data)
+    deflated.append(compressor.flush())
+    return deflated, crc, size, time.perf_counter() - start
+
+
+def add_pending(
+    zipf: zipfile.ZipFile,
+    root: Path,
+    pending: deque[tuple[Path, Future[Compressed]]],
+    stats: BundleStats,
+) -> None:
+    """Add the oldest pending entry, waiting for it to be compressed"""
+    entry, future = pending.popleft()
+    add_entry(zipf, root, entry, future.result(), stats)
+
+
+def add_entry(
+    zipf: zipfile.ZipFile,
+    root: Path,
+    entry: Path,
+    compressed: Compressed,
+    stats: BundleStats,
+) -> None:
+    """Add `entry` to the archive, followed by its precompressed siblings"""
+    deflated, variants = compressed
+    info = zip_info(root, entry)
+    if deflated is None:
+        add_stored(zipf, entry, info, stats)
+    else:
+        add_deflated(zipf, info, deflated, stats)
+    for suffix, data, seconds in variants:
+        # siblings are compressed already
+        variant = archive_info(f"{info.filename}{suffix}")
+        zipf.writestr(variant, data, zipfile.ZIP_STORED)
+        stats.add(variant, seconds)
+
+
+def add_stored(
+    zipf: zipfile.ZipFile, entry: Path, info: zipfile.ZipInfo, stats: BundleStats
+) -> None:
+    start = time.perf_counter()
+    info.file_size = entry.stat().st_size
+    with entry.open("rb") as source, zipf.open(info, "w") as target:
+        shutil.copyfileobj(source, target, CHUNK_SIZE)
+    stats.add(info, time.perf_counter() - start)
+
+
+def add_deflated(
+    zipf: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    deflated: Deflated,
+    stats: BundleStats,
+) -> None:
+    data, crc, size, seconds = deflated
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.CRC = crc
+    info.file_size = size
+    info.compress_size = sum(map(len, data))
+    # zipfile can only deflate the entries it writes itself, so the local
+    # header and data are written here and the entry registered for the
+    # central directory written on close
+    fp = zipf.fp
+    assert fp is not None
+    info.header_offset = fp.tell()
+    fp.write(info.FileHeader())
+    for chunk in data:
+        fp.write(chunk)
+    zipf.filelist.append(info)
+    zipf.NameToInfo[info.filename] = info
+    zipf.start_dir = fp.tell()
+    stats.add(info, seconds)
+
+
+@dataclass
+class QueueWriter:
+    """Write-only file passing what is written, in chunks, to an asyncio queue
+
+    It is written from a worker thread and blocks while the queue is full, so
+    the writer never runs more than the queue size ahead of the reader.
+    """
+
+    queue: asyncio.Queue[bytes | None]
+    loop: asyncio.AbstractEventLoop
+    chunk_size: int = CHUNK_SIZE
+    buffer: bytearray = field(default_factory=bytearray)
+    aborted: bool = False
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        while len(self.buffer) >= self.chunk_size:
+            self.put(bytes(self.buffer[: self.chunk_size]))
+            del self.buffer[: self.chunk_size]
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+        self.put(None)
+
+    def put(self, chunk: bytes | None) -> None:
+        if self.aborted:
+            raise StreamAbortedError
+        asyncio.run_coroutine_threadsafe(self.queue.put(chunk), self.loop).result()
+
+
+async def stream_zip(
+    path: Path,
+    chunk_size: int = CHUNK_SIZE,
+    buffer: int = BUFFER_CHUNKS,
+    jobs: int = 1,
+    policy: CompressionPolicy | None = None,
+    stats: BundleStats | None = None,
+    ignore: IgnoreRules | None = None,
+    precompress: Precompress | None = None,
+) -> AsyncIterator[bytes]:
+    """Zip directory `path` in a worker thread, yielding the zip as it grows
+
+    At most `buffer` chunks are held waiting for the consumer, so compressing
+    and sending overlap with flat memory and no temporary file.
+    """
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue(buffer)
+    writer = QueueWriter(queue, asyncio.get_running_loop(), chunk_size)
+
+    def produce() -> None:
+        try:
+            write_zip(
+                path,
+                writer,  # type: ignore[arg-type]
+                jobs,
+                policy,
+                stats,
+                ignore,
+                precompress,
+            )
+        finally:
+            if not writer.aborted:
+                writer.close()
+
+    task = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while (chunk := await queue.get()) is not None:
+            yield chunk
+        await task
+    finally:
+        if not task.done():
+            # unblock the writer, which aborts on its next chunk
+            writer.aborted = True
+            while not queue.empty():
+                queue.get_nowait()
+            try:
+                await task
+            except StreamAbortedError:
+                pass
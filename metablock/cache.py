@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from httpx2 import URL
+from httpx2 import Response as ClientResponse
+from typing_extensions import Annotated, Doc
+
+
+@dataclass
+class CacheEntry:
+    """A decoded response body with the validators to revalidate it"""
+
+    data: Any
+    path: str
+    expires: float
+    etag: str = ""
+    last_modified: str = ""
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """Conditional request headers asking the API if the entry changed"""
+        headers = {}
+        if self.etag:
+            headers["if-none-match"] = self.etag
+        if self.last_modified:
+            headers["if-modified-since"] = self.last_modified
+        return headers
+
+
+class CacheBackend(ABC):
+    """Storage of cache entries, evicting the least recently used ones"""
+
+    @abstractmethod
+    def get(self, key: str) -> CacheEntry | None: ...
+
+    @abstractmethod
+    def put(self, key: str, entry: CacheEntry) -> None: ...
+
+    @abstractmethod
+    def invalidate(self, paths: set[str], prefix: str) -> int:
+        """Drop entries with a path in `paths` or below `prefix`"""
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release what the storage holds, until the backend is used again"""
+
+
+@dataclass
+class MemoryCache(CacheBackend):
+    """In-memory LRU cache backend"""
+
+    max_entries: Annotated[int, Doc("Maximum number of entries kept")] = 1024
+    entries: OrderedDict[str, CacheEntry] = field(default_factory=OrderedDict)
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, paths: set[str], prefix: str) -> int:
+        keys = [
+            key
+            for key, entry in self.entries.items()
+            if entry.path in paths or entry.path.startswith(prefix)
+        ]
+        for key in keys:
+            self.entries.pop(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def close(self) -> None:
+        pass
+
+
+@dataclass
+class DiskCache(CacheBackend):
+    """LRU cache backend persisted in a sqlite database
+
+    Entries survive the process, so short lived processes such as the CLI can
+    revalidate rather than download again. Keys are stored hashed, since they
+    include the request headers and therefore the API token. The database is
+    queried on the event loop, blocking it for each cached GET, so this backend
+    is meant for the CLI and scripts rather than servers.
+
+    Reads do not write to the database: the times entries are used are kept
+    in memory and saved with the next write, or when the cache is closed.
+    """
+
+    path: Annotated[str | Path, Doc("Path of the sqlite database file")]
+    max_entries: Annotated[int, Doc("Maximum number of entries kept")] = 4096
+    db: sqlite3.Connection | None = field(init=False, default=None)
+    used: dict[str, float] = field(init=False, default_factory=dict)
+
+    def connect(self) -> sqlite3.Connection:
+        """The database connection, opened again after the cache is closed"""
+        if self.db is None:
+            self.db = sqlite3.connect(self.path)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, path TEXT, data TEXT, etag TEXT, "
+                "last_modified TEXT, expires REAL, used REAL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS entries_path ON entries (path)")
+            self.db.commit()
+        return self.db
+
+    def get(self, key: str) -> CacheEntry | None:
+        hashed = self.hash(key)
+        db = self.connect()
+        row = db.execute(
+            "SELECT path, data, etag, last_modified, expires "
+            "FROM entries WHERE key = ?",
+            (hashed,),
+        ).fetchone()
+        if row is None:
+            return None
+        self.used[hashed] = time.time()
+        path, data, etag, last_modified, expires = row
+        return CacheEntry(
+            data=json.loads(data),
+            path=path,
+            # monotonic clocks do not survive the process, expiry is stored as
+            # wall clock time and converted back
+            expires=expires - time.time() + time.monotonic(),
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        now = time.time()
+        db = self.connect()
+        self.save_used(db)
+        db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.hash(key),
+                entry.path,
+                json.dumps(entry.data),
+                entry.etag,
+                entry.last_modified,
+                entry.expires - time.monotonic() + now,
+                now,
+            ),
+        )
+        db.execute(
+            "DELETE FROM entries WHERE key NOT IN "
+            "(SELECT key FROM entries ORDER BY used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        db.commit()
+
+    def invalidate(self, paths: set[str], prefix: str) -> int:
+        marks = ", ".join("?" * len(paths))
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        db = self.connect()
+        cursor = db.execute(
+            f"DELETE FROM entries WHERE path IN ({marks}) "
+            "OR path LIKE ? ESCAPE '\\'",
+            (*paths, f"{escaped}%"),
+        )
+        db.commit()
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        self.used.clear()
+        db = self.connect()
+        db.execute("DELETE FROM entries")
+        db.commit()
+
+    def close(self) -> None:
+        if self.db is None:
+            return
+        self.save_used(self.db)
+        self.db.commit()
+        self.db.close()
+        self.db = None
+
+    def save_used(self, db: sqlite3.Connection) -> None:
+        """Write the times entries were used, without committing"""
+        if self.used:
+            db.executemany(
+                "UPDATE entries SET used = ? WHERE key = ?",
+                [(used, key) for key, used in self.used.items()],
+            )
+            self.used.clear()
+
+    @staticmethod
+    def hash(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+
+@dataclass
+class ResponseCache:
+    """Cache of decoded GET responses, revalidated with ETag/Last-Modified
+
+    Entries are served without a request for `ttl` seconds. After that, an
+    entry with validators is revalidated with a conditional request and a
+    `304` response renews it; entries without validators are fetched again.
+    Writes through the same client drop the entries of the path they modify.
+    Hits return the cached data itself, which callers must not modify.
+    """
+
+    ttl: Annotated[float, Doc("Seconds an entry is served without a request")] = 60.0
+    backend: Annotated[CacheBackend, Doc("Storage of the cache entries")] = field(
+        default_factory=MemoryCache
+    )
+    hits: int = field(init=False, default=0)
+    misses: int = field(init=False, default=0)
+    revalidated: int = field(init=False, default=0)
+    invalidated: int = field(init=False, default=0)
+
+    def get(self, key: str) -> CacheEntry | None:
+        """Get the entry for `key`, fresh or with validators to revalidate it"""
+        entry = self.backend.get(key)
+        if entry is None or not (entry.fresh or entry.validators):
+            self.misses += 1
+            return None
+        if entry.fresh:
+            self.hits += 1
+        return entry
+
+    def renew(self, key: str, entry: CacheEntry) -> None:
+        """Renew an entry the API confirmed unchanged"""
+        self.revalidated += 1
+        entry.expires = time.monotonic() + self.ttl
+        self.backend.put(key, entry)
+
+    def store(self, key: str, response: ClientResponse, data: Any) -> None:
+        """Store the decoded body of a successful response"""
+        if response.status_code != 200:
+            return
+        if "no-store" in response.headers.get("cache-control", ""):
+            return
+        entry = CacheEntry(
+            data=data,
+            path=response.request.url.path.rstrip("/"),
+            expires=time.monotonic() + self.ttl,
+            etag=response.headers.get("etag", ""),
+            last_modified=response.headers.get("last-modified", ""),
+        )
+        self.backend.put(key, entry)
+
+    def invalidate(self, url: str) -> None:
+        """Drop the entries a write to `url` may have changed
+
+        These are the entries for the path itself, for any path below it and
+        for its parent, which is the collection listing it.
+        """
+        path = URL(url).path.rstrip("/")
+        parent = path.rsplit("/", 1)[0]
+        self.invalidated += self.backend.invalidate({path, parent}, f"{path}/")
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def close(self) -> None:
+        self.backend.close()
@@ -1,12 +1,31 @@
 import asyncio
+import json
 import os
+import time
+from functools import partial
 from pathlib import Path
+from typing import Any, Sequence
 
 import click
-import jinja2
-import yaml
 
 from metablock import Metablock, __version__
+from metablock.bulk import DEFAULT_CONCURRENCY, run_bulk
+from metablock.bundle import (
+    BundleStats,
+    CompressionPolicy,
+    IgnoreRules,
+    deployment_hash,
+    deployment_name,
+    file_sizes,
+    format_size,
+    parse_size,
+    tree_hash,
+)
+from metablock.plan import BlockPlan, plan_block
+from metablock.precompress import Precompress
+from metablock.render import load_manifests
+from metablock.schema import Deployment, Space
+from metablock.state import ApplyState, manifest_hash
 from metablock.utils import temp_zipfile
 
 METABLOCK_SPACE = os.environ.get("METABLOCK_SPACE", "")
@@ -15,13 +34,18 @@ METABLOCK_NAME = os.environ.get("METABLOCK_NAME", "shipped from metablock-py")
 METABLOCK_BLOCK_ID = os.environ.get("METABLOCK_BLOCK_ID", "")
 METABLOCK_API_TOKEN = os.environ.get("METABLOCK_API_TOKEN", "")
 METABLOCK_ORG_ID = os.environ.get("METABLOCK_ORG_ID", "")
+METABLOCK_STATE = os.environ.get("METABLOCK_STATE", "")
 METABLOCK_API_TIMEOUT = int(os.environ.get("METABLOCK_API_TIMEOUT", "60"))
+METABLOCK_MAX_SIZE = os.environ.get("METABLOCK_MAX_SIZE", "")
+# files listed when a bundle is over its size budget
+LARGEST_FILES = 10
 
 
-def manifest(file_path: Path, params: dict) -> str:
-    env = jinja2.Environment()
-    template = env.from_string(file_path.read_text())
-    return template.render(**params)
+def size_option(ctx: click.Context, param: click.Parameter, value: str) -> int:
+    try:
+        return parse_size(value) if value else 0
+    except ValueError as exc:
+        raise click.BadParameter(str(exc)) from exc
 
 
 @click.group()
@@ -34,9 +58,13 @@ def main() -> None:
 @click.argument("path", type=click.Path(exists=True))
 @click.option(
     "--space",
-    "space_name",
-    help="Space name",
-    default=METABLOCK_SPACE,
+    "spaces",
+    help=(
+        "Space name, or org-id/space-name for a space of another organization;"
+        " repeat or separate with commas to apply to many spaces"
+    ),
+    multiple=True,
+    default=[METABLOCK_SPACE] if METABLOCK_SPACE else [],
     show_default=True,
 )
 @click.option(
@@ -55,15 +83,62 @@ def main() -> None:
     is_flag=True,
     help="Do not apply changes, just show what would be done",
 )
-def apply(path: str, space_name: str, token: str, org_id: str, dry_run: bool) -> None:
-    """Apply metablock manifest to a metablock space"""
+@click.option(
+    "--plan",
+    "show_plan",
+    is_flag=True,
+    help="Do not apply changes, show how each block differs from its manifest",
+)
+@click.option(
+    "--state",
+    "state_path",
+    help="File recording the manifests applied, to skip the unchanged ones",
+    default=METABLOCK_STATE,
+)
+@click.option(
+    "--refresh",
+    is_flag=True,
+    help="Apply every manifest, even if unchanged in the state file",
+)
+@click.option(
+    "--concurrency",
+    help="Maximum number of blocks created or updated at once",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+)
+@click.option(
+    "--jobs",
+    help="Processes rendering the manifests, 0 for one per CPU on large directories",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+)
+def apply(
+    path: str,
+    spaces: tuple[str, ...],
+    token: str,
+    org_id: str,
+    dry_run: bool,
+    show_plan: bool,
+    state_path: str,
+    refresh: bool,
+    concurrency: int,
+    jobs: int,
+) -> None:
+    """Apply metablock manifest to metablock spaces"""
     asyncio.run(
         _apply(
             path,
-            space_name or METABLOCK_SPACE,
+            spaces,
             token or METABLOCK_API_TOKEN,
             org_id or METABLOCK_ORG_ID,
             dry_run=dry_run,
+            show_plan=show_plan,
+            state_path=state_path or METABLOCK_STATE,
+            refresh=refresh,
+            concurrency=concurrency,
+            jobs=jobs,
         )
     )
 
@@ -107,6 +182,64 @@ def apply(path: str, space_name: str, token: str, org_id: str, dry_run: bool) ->
     default=METABLOCK_API_TIMEOUT,
     show_default=True,
 )
+@click.option(
+    "--pipeline",
+    is_flag=True,
+    help="Zip the bundle while uploading it, without a temporary zip file",
+)
+@click.option(
+    "--jobs",
+    help="Threads compressing the bundle files, 0 for one per CPU",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+)
+@click.option(
+    "--level",
+    help="Deflate level of the bundle files, from 1 (fastest) to 9 (smallest)",
+    type=click.IntRange(1, 9),
+    default=6,
+    show_default=True,
+)
+@click.option(
+    "--report",
+    is_flag=True,
+    help="Report the bytes saved and time spent compressing each file type",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Ship even when the bundle is unchanged since the last deployment",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    help=(
+        "Pattern of files left out of the bundle, on top of those in its "
+        ".metablockignore file; prefix it with ! to include files again"
+    ),
+)
+@click.option(
+    "--max-size",
+    help=(
+        "Fail when the bundle files add up to more than this, such as 20MiB; "
+        "--precompress siblings are not counted"
+    ),
+    default=METABLOCK_MAX_SIZE,
+    callback=size_option,
+)
+@click.option(
+    "--precompress",
+    is_flag=True,
+    help="Add .gz and, with brotli installed, .br siblings of the text assets",
+)
+@click.option(
+    "--precompress-min-size",
+    help="Text assets smaller than this are not precompressed",
+    default="1KiB",
+    show_default=True,
+    callback=size_option,
+)
 def ship(
     path: str,
     env: str,
@@ -115,6 +248,15 @@ def ship(
     token: str,
     org_id: str,
     timeout: int,
+    pipeline: bool,
+    jobs: int,
+    level: int,
+    report: bool,
+    force: bool,
+    exclude: tuple[str, ...],
+    max_size: int,
+    precompress: bool,
+    precompress_min_size: int,
 ) -> None:
     """Deploy a new version of an html block"""
     asyncio.run(
@@ -126,46 +268,297 @@ def ship(
             token or METABLOCK_API_TOKEN,
             org_id or METABLOCK_ORG_ID,
             timeout or METABLOCK_API_TIMEOUT,
+            pipeline=pipeline,
+            jobs=jobs,
+            level=level,
+            report=report,
+            force=force,
+            exclude=exclude,
+            max_size=max_size,
+            precompress=(
+                Precompress(min_size=precompress_min_size) if precompress else None
+            ),
         )
     )
 
 
 async def _apply(
-    path: str, space_name: str, token: str, org_id: str, dry_run: bool
+    path: str,
+    spaces: str | Sequence[str],
+    token: str,
+    org_id: str,
+    dry_run: bool,
+    show_plan: bool = False,
+    state_path: str = "",
+    refresh: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    jobs: int = 0,
 ) -> None:
     if not token:
         click.echo("metablock API token is required", err=True)
         raise click.Abort()
-    if not space_name:
+    targets = parse_targets(spaces, org_id)
+    if not targets:
         click.echo("metablock space is required", err=True)
         raise click.Abort()
-    p = Path(path)
-    blocks = []
-    for file_path in p.glob("*.yaml"):
-        name = file_path.name.split(".")[0]
-        text = manifest(file_path, dict(space=space_name, block=name))
-        if dry_run:
-            click.echo(text)
-        else:
-            blocks.append((name, yaml.safe_load(text)))
-    if not blocks:
+    # the state is not used to plan, the plan compares with the space itself
+    state = ApplyState.load(state_path) if state_path and not show_plan else None
+    files = list(Path(path).glob("*.yaml"))
+    items = [
+        (file_path, dict(space=space_name, block=file_path.name.split(".")[0]))
+        for _, space_name in targets
+        for file_path in files
+    ]
+    loaded = iter(load_manifests(items, jobs, parse=not dry_run))
+    work: dict[Target, list[tuple[str, dict[str, Any]]]] = {}
+    digests: dict[Target, dict[str, str]] = {}
+    skipped = 0
+    for target in targets:
+        key = state_key(*target)
+        blocks = work[target] = []
+        digests[target] = {}
+        unchanged = 0
+        for file_path in files:
+            name = file_path.name.split(".")[0]
+            text, config = next(loaded)
+            if dry_run:
+                click.echo(text)
+                continue
+            digest = manifest_hash(text)
+            if state and not refresh and state.unchanged(key, name, digest):
+                unchanged += 1
+            else:
+                digests[target][name] = digest
+                blocks.append((name, config))
+        if unchanged:
+            skipped += unchanged
+            click.echo(
+                f"skipped {unchanged} manifests of space {target[1]} "
+                "unchanged since the last apply"
+            )
+        if not blocks:
+            work.pop(target)
+    if not work:
+        if skipped:
+            return
         click.echo("nothing to do")
         raise click.Abort()
     async with Metablock(auth_key=token, org_id=org_id) as mb:
-        space = await mb.spaces.get(space_name)
-        space_blocks = await mb.spaces.blocks(space.id)
-        click.echo(f"space {space.name} has {len(space_blocks)} blocks")
-        by_name = {s.name: s for s in space_blocks}
-        for name, config in blocks:
-            block = by_name.get(name)
-            if block:
-                # update
-                await mb.blocks.update(block.id, **config)
-                click.echo(f"updated block {name}")
+        clients = {org: mb.for_org(org) for org in {org for org, _ in work}}
+        if show_plan:
+            await plan_spaces(clients, work, concurrency)
+            return
+        start = time.perf_counter()
+        applied = await run_bulk(
+            (
+                (
+                    target,
+                    partial(
+                        apply_blocks, clients[target[0]], target[1], blocks, concurrency
+                    ),
+                )
+                for target, blocks in work.items()
+            ),
+            len(work),
+        )
+    failed = 0
+    for result in applied:
+        target = result.key
+        if result.value is None:
+            failed += 1
+            click.echo(f"failed to apply space {target[1]}: {result.error}")
+            continue
+        failed += any(plan.error for plan in result.value)
+        if not state:
+            continue
+        key = state_key(*target)
+        for plan in result.value:
+            if plan.in_sync:
+                state.record(key, plan.name, digests[target][plan.name], plan.block_id)
             else:
-                # create
-                await mb.spaces.create_block(space.id, name=name, **config)
-                click.echo(f"created new block {name}")
+                state.forget(key, plan.name)
+    if state:
+        state.save()
+    if len(applied) > 1:
+        click.echo(
+            f"applied {len(applied)} spaces in {time.perf_counter() - start:.2f}s: "
+            f"{len(applied) - failed} succeeded, {failed} failed"
+        )
+    if failed:
+        raise click.Abort()
+
+
+Target = tuple[str, str]
+
+
+async def plan_spaces(
+    clients: dict[str, Metablock],
+    work: dict[Target, list[tuple[str, dict[str, Any]]]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> None:
+    """Print the plan of every space, planning the spaces concurrently"""
+    planned = await run_bulk(
+        (
+            (
+                target,
+                partial(
+                    plan_blocks, clients[target[0]], target[1], blocks, concurrency
+                ),
+            )
+            for target, blocks in work.items()
+        ),
+        len(work),
+    )
+    for result in planned:
+        if result.value is None:
+            click.echo(f"failed to plan space {result.key[1]}: {result.error}")
+        else:
+            space, plans = result.value
+            click.echo(f"space {space.name}\n{format_plan(plans)}")
+    if not all(result.ok for result in planned):
+        raise click.Abort()
+
+
+def parse_targets(spaces: str | Sequence[str], org_id: str) -> list[Target]:
+    """The (org id, space name) pairs to apply to, in the order given
+
+    Every value holds one or more comma separated spaces, each a space name
+    within organization `org_id` or `org-id/space-name`.
+    """
+    if isinstance(spaces, str):
+        spaces = [spaces]
+    targets: dict[Target, None] = {}
+    for value in spaces:
+        for space in value.split(","):
+            org, _, name = space.strip().rpartition("/")
+            if name:
+                targets[(org or org_id, name)] = None
+    return list(targets)
+
+
+def state_key(org_id: str, space_name: str) -> str:
+    return f"{org_id}/{space_name}" if org_id else space_name
+
+
+async def apply_blocks(
+    mb: Metablock,
+    space_name: str,
+    blocks: list[tuple[str, dict[str, Any]]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> list[BlockPlan]:
+    """Create or update the `blocks` of a space, skipping unchanged ones
+
+    Blocks are created and updated concurrently, at most `concurrency` at
+    once. The report of the space is written at once when all are done, in
+    the order of `blocks`, so spaces applied concurrently do not interleave.
+    """
+    start = time.perf_counter()
+    space, plans = await plan_blocks(mb, space_name, blocks, concurrency)
+    changed = [plan for plan in plans if plan.action != "unchanged"]
+    results = await run_bulk(
+        ((plan, partial(apply_block, mb, space.id, plan)) for plan in changed),
+        concurrency,
+    )
+    for result in results:
+        result.key.error = result.error
+    click.echo(format_report(space, plans, time.perf_counter() - start))
+    return plans
+
+
+def format_report(space: Space, plans: list[BlockPlan], elapsed: float) -> str:
+    """Text reporting the outcome of applying `plans` to a space"""
+    lines = [f"space {space.name} has {len(plans)} manifests"]
+    counts = dict.fromkeys(("created", "updated", "unchanged", "failed"), 0)
+    for plan in plans:
+        if plan.error:
+            counts["failed"] += 1
+            lines.append(f"failed to {plan.action} block {plan.name}: {plan.error}")
+        elif plan.action == "create":
+            counts["created"] += 1
+            lines.append(f"created new block {plan.name} in {plan.duration:.2f}s")
+        elif plan.action == "update":
+            counts["updated"] += 1
+            lines.append(f"updated block {plan.name} in {plan.duration:.2f}s")
+        else:
+            counts["unchanged"] += 1
+            lines.append(f"unchanged block {plan.name}")
+    summary = ", ".join(f"{count} {action}" for action, count in counts.items())
+    lines.append(f"applied {len(plans)} blocks in {elapsed:.2f}s: {summary}")
+    return "\n".join(lines)
+
+
+async def plan_blocks(
+    mb: Metablock,
+    space_name: str,
+    blocks: list[tuple[str, dict[str, Any]]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> tuple[Space, list[BlockPlan]]:
+    """Plan the `blocks` manifests against the blocks of a space
+
+    The space and its blocks are fetched at once. The block list may come
+    without routes, in which case the blocks with routes to compare are
+    fetched concurrently, at most `concurrency` at once.
+    """
+    space, space_blocks = await asyncio.gather(
+        mb.spaces.get(space_name), mb.spaces.blocks(space_name)
+    )
+    by_name = {s.name: s for s in space_blocks}
+    plans = [plan_block(name, config, by_name.get(name)) for name, config in blocks]
+    without_routes = {
+        plan.block.id: index
+        for index, plan in enumerate(plans)
+        if plan.block and plan.block.routes is None and "routes" in plan.config
+    }
+    if without_routes:
+        for fetched in await mb.blocks.get_many(
+            without_routes, concurrency=concurrency
+        ):
+            if fetched.value is not None:
+                index = without_routes[fetched.key]
+                name, config = blocks[index]
+                plans[index] = plan_block(name, config, fetched.value)
+    return space, plans
+
+
+def format_plan(plans: list[BlockPlan]) -> str:
+    """Text of the plan, one line per block followed by its changes"""
+    symbols = dict(create="+", update="~", unchanged="=")
+    lines = []
+    counts = dict.fromkeys(symbols, 0)
+    for plan in plans:
+        counts[plan.action] += 1
+        lines.append(f"{symbols[plan.action]} {plan.action} block {plan.name}")
+        if plan.action == "create":
+            lines.extend(
+                f"    {key}: {format_value(value)}"
+                for key, value in plan.config.items()
+            )
+        for change in plan.changes:
+            lines.append(
+                f"    {change.field}: {format_value(change.current)} -> "
+                f"{format_value(change.desired)}"
+            )
+    summary = ", ".join(f"{count} to {action}" for action, count in counts.items())
+    lines.append(f"plan: {summary.replace('to unchanged', 'unchanged')}")
+    return "\n".join(lines)
+
+
+def format_value(value: Any) -> str:
+    if value is None:
+        return "-"
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+async def apply_block(mb: Metablock, space_id: str, plan: BlockPlan) -> None:
+    """Create or update the block of `plan`, recording the block and timing"""
+    start = time.perf_counter()
+    if plan.block:
+        plan.applied = await mb.blocks.update(plan.block.id, **plan.config)
+    else:
+        plan.applied = await mb.spaces.create_block(
+            space_id, name=plan.name, **plan.config
+        )
+    plan.duration = time.perf_counter() - start
 
 
 async def _ship(
@@ -176,6 +569,14 @@ async def _ship(
     token: str,
     org_id: str,
     timeout: int = METABLOCK_API_TIMEOUT,
+    pipeline: bool = False,
+    jobs: int = 0,
+    level: int = 6,
+    report: bool = False,
+    force: bool = False,
+    exclude: Sequence[str] = (),
+    max_size: int = 0,
+    precompress: Precompress | None = None,
 ) -> None:
     if not token:
         click.echo("metablock API token is required", err=True)
@@ -184,19 +585,70 @@ async def _ship(
         click.echo("metablock block-id is required", err=True)
         raise click.Abort()
     p = Path(path)
-    try:
-        with temp_zipfile(p) as zip_path:
-            click.echo(f"Created zip file: {zip_path}")
-            async with Metablock(auth_key=token, org_id=org_id) as mb:
-                block = await mb.blocks.get(block_id)
+    if not p.is_dir():
+        click.echo(f"Path {p} is not a directory", err=True)
+        raise click.Abort()
+    ignore = IgnoreRules.load(p, exclude)
+    if max_size:
+        check_size(p, await asyncio.to_thread(file_sizes, p, ignore), max_size)
+    policy = CompressionPolicy(level=level)
+    stats = BundleStats()
+    digest = await asyncio.to_thread(tree_hash, p, ignore, precompress)
+    async with Metablock(auth_key=token, org_id=org_id) as mb:
+        block = await mb.blocks.get(block_id)
+        if not force and (deployed := await last_shipped(mb, block.id, env, digest)):
+            click.echo(
+                f"skipped {p}, unchanged since deployment {deployed.id} "
+                f"to {block.name} {env}"
+            )
+            return
+        name = deployment_name(name, digest)
+        if pipeline:
+            await mb.blocks.ship(
+                block.id,
+                p,
+                name=name,
+                env=env,
+                jobs=jobs,
+                policy=policy,
+                stats=stats,
+                ignore=ignore,
+                precompress=precompress,
+                timeout=timeout,
+            )
+            click.echo(f"shipped {p} to {block.name} {env}")
+        else:
+            with temp_zipfile(p, jobs, policy, stats, ignore, precompress) as zip_path:
+                click.echo(f"Created zip file: {zip_path}")
                 await mb.blocks.ship(
-                    block.id,
-                    zip_path,
-                    name=name,
-                    env=env,
-                    timeout=timeout,
+                    block.id, zip_path, name=name, env=env, timeout=timeout
                 )
                 click.echo(f"shipped {zip_path} to {block.name} {env}")
-    except ValueError as e:
-        click.echo(str(e), err=True)
-        raise click.Abort() from None
+    if report:
+        click.echo("\n".join(stats.report()))
+
+
+async def last_shipped(
+    mb: Metablock, block_id: str, env: str, digest: str
+) -> Deployment | None:
+    """The latest deployment of the block to `env`, if it shipped `digest`"""
+    deployments = await mb.blocks.deployments(block_id, env=env, limit=1)
+    if deployments and deployment_hash(deployments[0].name) == digest:
+        return deployments[0]
+    return None
+
+
+def check_size(path: Path, sizes: dict[str, int], max_size: int) -> None:
+    """Abort when the bundle files add up to more than `max_size` bytes"""
+    total = sum(sizes.values())
+    if total <= max_size:
+        return
+    click.echo(
+        f"bundle {path} is {format_size(total)}, over the budget of "
+        f"{format_size(max_size)}; largest files:",
+        err=True,
+    )
+    largest = sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+    for name, size in largest[:LARGEST_FILES]:
+        click.echo(f"{format_size(size):>12}  {name}", err=True)
+    raise click.Abort()
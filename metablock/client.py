@@ -3,20 +3,32 @@ from __future__ import annotations
 import logging
 import os
 import sys
-from dataclasses import dataclass, field
-from typing import Any, Self
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Any, AsyncIterator, Self
 
-from httpx2 import AsyncClient
+from httpx2 import URL, AsyncClient, TransportError
 from httpx2 import Response as ClientResponse
 
+from .bulk import bulk_controller
+from .cache import CacheEntry, ResponseCache
+from .codec import JsonCodec, get_codec, iter_json_array
 from .components import Callback, MetablockResponseError
 from .extensions import Extensions, OrgExtensions
 from .orgs import Orgs
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy, RetryStats, parse_retry_after
+from .singleflight import SingleFlight
 from .spaces import Blocks, Spaces
+from .transport import TransportConfig
 from .user import Users
 
 DEFAULT_USER_AGENT = f"Python/{'.'.join(map(str, sys.version_info[:2]))} metablock"
 
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
 logger = logging.getLogger("metablock.client")
 
 
@@ -38,8 +50,15 @@ class Metablock:
     auth_key_name: str = "x-metablock-api-key"
     org_id_name: str = "x-metablock-org-id"
     session: AsyncClient | None = None
+    transport: TransportConfig = field(default_factory=TransportConfig)
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    rate_limit: RateLimiter | None = None
+    single_flight: SingleFlight | None = field(default_factory=SingleFlight)
+    cache: ResponseCache | None = None
+    codec: JsonCodec = field(default_factory=get_codec)
     user_agent: str = DEFAULT_USER_AGENT
     session_owner: bool = field(init=False, default=False)
+    retry_stats: RetryStats = field(init=False, default_factory=RetryStats)
 
     def __post_init__(self) -> None:
         self.session_owner = self.session is None
@@ -68,10 +87,31 @@ class Metablock:
     def user(self) -> Users:
         return Users(self)
 
+    def get_session(self) -> AsyncClient:
+        """Get the HTTP session, creating it on first use
+
+        This never awaits, so concurrent first requests on the event loop all
+        share the one session created by whichever runs first.
+        """
+        if self.session is None:
+            self.session = self.transport.create_session()
+            self.session_owner = True
+        return self.session
+
+    def for_org(self, org_id: str) -> Metablock:
+        """Client acting within organization `org_id`
+
+        It shares the session, and so the connection pool, and the policies of
+        this client, which stays the owner of the session and closes it.
+        """
+        return replace(self, org_id=org_id, session=self.get_session())
+
     async def close(self) -> None:
         if self.session and self.session_owner:
             await self.session.aclose()
             self.session = None
+        if self.cache is not None and self.session_owner:
+            self.cache.close()
 
     async def __aenter__(self) -> Self:
         return self
@@ -117,13 +157,57 @@ class Metablock:
         wrap: Any = None,
         **kw: Any,
     ) -> Any:
-        """Make a request to the API with the given method, url, headers and body."""
-        if not self.session:
-            self.session = AsyncClient()
-        method = method or "GET"
+        """Make a request to the API with the given method, url, headers and body.
+
+        Concurrent identical GET requests share a single round-trip, and its
+        decoded response, unless `single_flight` is disabled on the client.
+        When the client has a `cache`, GET responses are served from it and
+        any other method drops the cached entries of the path it modifies.
+        """
+        method = (method or "GET").upper()
         headers_ = self.get_default_headers()
         headers_.update(headers or ())
-        response = await self.session.request(method, url, headers=headers_, **kw)
+        key = None
+        if callback is None and wrap is None:
+            key = self.request_key(method, url, headers_, kw)
+        if key is None:
+            try:
+                return await self.fetch(
+                    method, url, headers_, callback=callback, wrap=wrap, **kw
+                )
+            finally:
+                if self.cache is not None and method not in SAFE_METHODS:
+                    self.cache.invalidate(url)
+        if self.cache is None:
+            call = partial(self.fetch, method, url, headers_, **kw)
+        else:
+            entry = self.cache.get(key)
+            if entry is not None and entry.fresh:
+                return entry.data
+            call = partial(self.fetch_cached, key, entry, url, headers_, **kw)
+        if self.single_flight is None:
+            return await call()
+        return await self.single_flight.run(key, call)
+
+    async def fetch(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        callback: Callback | bool | None = None,
+        wrap: Any = None,
+        **kw: Any,
+    ) -> Any:
+        """Send a request, with retries, and handle its response"""
+        if kw.get("json") is not None:
+            kw["content"] = self.codec.dumps(kw.pop("json"))
+            headers = {**headers, "content-type": "application/json"}
+        response = await self.retry.run(
+            method,
+            url,
+            partial(self.send, method, url, headers=headers, **kw),
+            self.retry_stats,
+        )
         if callback is True:
             return response
         elif callback:
@@ -131,17 +215,105 @@ class Metablock:
         else:
             return await self.handle_response(response, wrap=wrap)
 
+    async def fetch_cached(
+        self,
+        key: str,
+        entry: CacheEntry | None,
+        url: str,
+        headers: dict[str, str],
+        **kw: Any,
+    ) -> Any:
+        """GET a resource into the cache, revalidating a stale `entry`"""
+        assert self.cache is not None
+        if entry is not None:
+            headers = {**headers, **entry.validators}
+        response = await self.fetch("GET", url, headers, callback=True, **kw)
+        if entry is not None and response.status_code == 304:
+            self.cache.renew(key, entry)
+            return entry.data
+        data = await self.handle_response(response)
+        self.cache.store(key, response, data)
+        return data
+
+    def request_key(
+        self, method: str, url: str, headers: dict[str, str], kw: dict[str, Any]
+    ) -> str | None:
+        """Key identifying identical GET requests, None if they cannot be shared
+
+        Only requests with no options besides query params are shared or
+        cached, since any other option (a timeout, a body) could make the
+        responses differ.
+        """
+        if method != "GET" or not set(kw) <= {"params"}:
+            return None
+        full_url = URL(url).copy_merge_params(kw.get("params") or {})
+        return "\n".join(
+            (str(full_url), *(f"{k}: {v}" for k, v in sorted(headers.items())))
+        )
+
+    async def stream(
+        self, url: str, headers: dict[str, str] | None = None, **kw: Any
+    ) -> AsyncIterator[Any]:
+        """GET a JSON array and yield its elements as they are received
+
+        The body is never held in memory as a whole. Streams bypass the cache,
+        single-flight and retries, since a partially consumed body cannot be
+        shared or sent again, but are subject to the client rate limits.
+        """
+        headers_ = self.get_default_headers()
+        headers_.update(headers or ())
+        org_id = headers_.get(self.org_id_name, "")
+        async with AsyncExitStack() as stack:
+            if self.rate_limit is not None:
+                await stack.enter_async_context(self.rate_limit.limit(org_id))
+            response = await stack.enter_async_context(
+                self.get_session().stream("GET", url, headers=headers_, **kw)
+            )
+            if response.status_code >= 300:
+                await response.aread()
+                await self.handle_response(response)
+            async for item in iter_json_array(response.aiter_bytes()):
+                yield item
+
+    async def send(
+        self, method: str, url: str, headers: dict[str, str], **kw: Any
+    ) -> ClientResponse:
+        """Send one attempt of a request, within the client rate limits
+
+        The attempt is reported to the adaptive concurrency controller of the
+        bulk operation it belongs to, if any.
+        """
+        session = self.get_session()
+        controller = bulk_controller.get()
+        org_id = headers.get(self.org_id_name, "")
+        async with AsyncExitStack() as stack:
+            if self.rate_limit is not None:
+                await stack.enter_async_context(self.rate_limit.limit(org_id))
+            start = time.monotonic()
+            try:
+                response = await session.request(method, url, headers=headers, **kw)
+            except TransportError:
+                if controller is not None:
+                    controller.observe(time.monotonic() - start)
+                raise
+        if controller is not None:
+            controller.observe(time.monotonic() - start, response.status_code)
+        if self.rate_limit is not None and response.status_code == 429:
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+            self.rate_limit.pause(org_id, retry_after or 1.0)
+        return response
+
     async def handle_response(self, response: ClientResponse, wrap: Any = None) -> Any:
         if response.status_code == 204:
             return True
         if response.status_code >= 400:
             try:
-                data = response.json()
+                data = self.codec.loads(response.content)
             except Exception:
                 data = response.text
             raise MetablockResponseError(response, data)
         response.raise_for_status()
-        data = response.json()
+        data = self.codec.loads(response.content)
         return wrap(data) if wrap else data
 
     def get_default_headers(self) -> dict[str, str]:
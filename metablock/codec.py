@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, ClassVar
+
+
+@dataclass
+class JsonCodec:
+    """Encode request bodies and decode response bodies with the stdlib `json`
+
+    Subclasses plug faster libraries; `get_codec` picks the fastest installed.
+    """
+
+    name: ClassVar[str] = "json"
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(data, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes | str) -> Any:
+        return json.loads(data)
+
+
+@dataclass
+class OrjsonCodec(JsonCodec):
+    """JSON codec backed by `orjson`, install with `metablock[orjson]`"""
+
+    name: ClassVar[str] = "orjson"
+
+    def __post_init__(self) -> None:
+        import orjson
+
+        self.orjson = orjson
+
+    def dumps(self, data: Any) -> bytes:
+        return self.orjson.dumps(data)
+
+    def loads(self, data: bytes | str) -> Any:
+        return self.orjson.loads(data)
+
+
+@dataclass
+class MsgspecCodec(JsonCodec):
+    """JSON codec backed by `msgspec`"""
+
+    name: ClassVar[str] = "msgspec"
+
+    def __post_init__(self) -> None:
+        import msgspec
+
+        self.encoder = msgspec.json.Encoder()
+        self.decoder = msgspec.json.Decoder()
+
+    def dumps(self, data: Any) -> bytes:
+        return self.encoder.encode(data)
+
+    def loads(self, data: bytes | str) -> Any:
+        return self.decoder.decode(data)
+
+
+SCALAR_END = re.compile(r"[,\]\s]")
+CODECS: tuple[type[JsonCodec], ...] = (OrjsonCodec, MsgspecCodec, JsonCodec)
+
+
+def get_codec(name: str = "") -> JsonCodec:
+    """Get the codec `name`, or the fastest one installed when not given"""
+    for codec in CODECS:
+        if name and codec.name != name:
+            continue
+        try:
+            return codec()
+        except ImportError:
+            if name:
+                raise
+    raise ValueError(f"unknown JSON codec {name}")
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """Decode the elements of a JSON array as its bytes arrive
+
+    Only the element being received is held in memory, so the memory used is
+    flat regardless of the length of the array. Elements are decoded with the
+    C accelerated `raw_decode` of the stdlib, retried when a chunk ends midway
+    through an element.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+    done = False
+    async for chunk in chunks:
+        buffer += utf8.decode(chunk)
+        index = 0
+        while not done:
+            index = skip_whitespace(buffer, index)
+            if index == len(buffer):
+                break
+            if not started:
+                if buffer[index] != "[":
+                    raise ValueError("expected a JSON array")
+                started = True
+                index += 1
+                continue
+            if buffer[index] == "]":
+                done = True
+                break
+            if buffer[index] == ",":
+                index += 1
+                continue
+            if buffer[index] not in '[{"' and not SCALAR_END.search(buffer, index):
+                # a number or literal may continue in the next chunk
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, index)
+            except json.JSONDecodeError:
+                # the element is incomplete, wait for more bytes
+                break
+            yield item
+            index = end
+        buffer = buffer[index:]
+    if not done:
+        raise ValueError("JSON array is truncated or invalid")
+
+
+def skip_whitespace(text: str, index: int) -> int:
+    while index < len(text) and text[index] in " \t\n\r":
+        index += 1
+    return index
@@ -2,17 +2,29 @@ from __future__ import annotations
 
 import json
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Awaitable, Callable, ClassVar
+from functools import cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ClassVar,
+    TypeVar,
+)
 
 from httpx2 import Response as ClientResponse
+from pydantic import BaseModel, TypeAdapter
 
-from .utils import as_dict
+from .pagination import Page, iter_pages, next_cursor
+from .utils import as_dict, compact_dict
 
 if TYPE_CHECKING:  # pragma: no cover
     from .client import Metablock
 
 
 Callback = Callable[[ClientResponse], Awaitable[Any]]
+M = TypeVar("M", bound=BaseModel)
 
 
 class MetablockError(Exception):
@@ -50,3 +62,49 @@ class Manager:
     @property
     def url(self) -> str:
         return f"{self.cli.url}/{self.path}"
+
+    def model(self, model: type[M], data: Any) -> M:
+        """Build a validated `model` instance from a payload"""
+        return model.model_validate(data)
+
+    def models(self, model: type[M], data: Any) -> list[M]:
+        """Build `model` instances from a list payload, in one pass"""
+        return list_adapter(model).validate_python(data)
+
+    async def stream_models(
+        self, model: type[M], url: str, **kwargs: Any
+    ) -> AsyncIterator[M]:
+        """Stream a list endpoint, yielding `model` instances one by one"""
+        async for item in self.cli.stream(url, **kwargs):
+            yield self.model(model, item)
+
+    async def iter_models(
+        self,
+        model: type[M],
+        url: str,
+        params: dict[str, Any],
+        prefetch: int = 1,
+        **kwargs: Any,
+    ) -> AsyncIterator[M]:
+        """Walk all pages of a cursor paginated endpoint, yielding `model`s
+
+        The cursor in `params`, if any, is where the walk starts.
+        """
+
+        async def fetch(cursor: str | None) -> Page:
+            response = await self.cli.get(
+                url, params=compact_dict(params, cursor=cursor), callback=True, **kwargs
+            )
+            data = await self.cli.handle_response(response)
+            return data, next_cursor(response)
+
+        start = params.pop("cursor", None)
+        async for page in iter_pages(fetch, start, prefetch):
+            for item in self.models(model, page):
+                yield item
+
+
+@cache
+def list_adapter(model: type[M]) -> TypeAdapter[list[M]]:
+    """Adapter validating a list of `model`, built once per model"""
+    return TypeAdapter(list[model])  # type: ignore[valid-type]
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, ClassVar
+from typing import Any, AsyncIterator, ClassVar
 
 from typing_extensions import Annotated, Doc
 
@@ -19,7 +19,19 @@ class Extensions(Manager):
     async def get_list(self, *, cursor: str | None = None) -> list[Extension]:
         """Get a list of extensions"""
         data = await self.cli.get(self.url, params=compact_dict(cursor=cursor))
-        return [Extension(**e) for e in data]
+        return self.models(Extension, data)
+
+    async def iter_list(
+        self,
+        *,
+        cursor: Annotated[str | None, Doc("Cursor to start from")] = None,
+        prefetch: Annotated[int, Doc("Pages fetched ahead of the consumer")] = 1,
+    ) -> AsyncIterator[Extension]:
+        """Iterate over all the extensions, page by page"""
+        async for extension in self.iter_models(
+            Extension, self.url, compact_dict(cursor=cursor), prefetch=prefetch
+        ):
+            yield extension
 
 
 @dataclass
@@ -43,9 +55,47 @@ class OrgExtensions(Manager):
             params=compact_dict(name=name, search=search, limit=limit, cursor=cursor),
             **kwargs,
         )
-        return [Extension(**e) for e in data]
+        return self.models(Extension, data)
+
+    async def iter_list(
+        self,
+        *,
+        name: Annotated[str | None, Doc("Filter by extension name")] = None,
+        search: Annotated[str | None, Doc("Search extensions")] = None,
+        limit: Annotated[int | None, Doc("Number of extensions per page")] = None,
+        cursor: Annotated[str | None, Doc("Cursor to start from")] = None,
+        prefetch: Annotated[int, Doc("Pages fetched ahead of the consumer")] = 1,
+        **kwargs: Any,
+    ) -> AsyncIterator[Extension]:
+        """Iterate over all the extensions owned by the organization"""
+        async for extension in self.iter_models(
+            Extension,
+            self.url,
+            compact_dict(name=name, search=search, limit=limit, cursor=cursor),
+            prefetch=prefetch,
+            **kwargs,
+        ):
+            yield extension
+
+    async def stream_list(
+        self,
+        *,
+        name: Annotated[str | None, Doc("Filter by extension name")] = None,
+        search: Annotated[str | None, Doc("Search extensions")] = None,
+        limit: Annotated[int | None, Doc("Maximum number of extensions")] = None,
+        cursor: Annotated[str | None, Doc("Cursor for pagination")] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Extension]:
+        """Stream the extensions owned by the organization"""
+        async for extension in self.stream_models(
+            Extension,
+            self.url,
+            params=compact_dict(name=name, search=search, limit=limit, cursor=cursor),
+            **kwargs,
+        ):
+            yield extension
 
     async def create(self, **data: Any) -> Extension:
         """Create a new extension in the organization"""
         payload = await self.cli.post(self.url, json=data)
-        return Extension(**payload)
+        return self.model(Extension, payload)
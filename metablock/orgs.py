@@ -17,22 +17,22 @@ class Orgs(Manager):
     async def get(self, org_id_or_name: str) -> Org:
         """Get an organization by name or id"""
         data = await self.cli.get(f"{self.url}/{org_id_or_name}")
-        return Org(**data)
+        return self.model(Org, data)
 
     async def create(self, **data: Any) -> Org:
         """Create a new organization"""
         payload = await self.cli.post(self.url, json=data)
-        return Org(**payload)
+        return self.model(Org, payload)
 
     async def update(self, org_id_or_name: str, **data: Any) -> Org:
         """Update an organization by name or id"""
         payload = await self.cli.patch(f"{self.url}/{org_id_or_name}", json=data)
-        return Org(**payload)
+        return self.model(Org, payload)
 
     async def roles(self, org_id_or_name: str) -> list[OrgRole]:
         """Get a list of roles in the organization"""
         data = await self.cli.get(f"{self.url}/{org_id_or_name}/roles")
-        return [OrgRole(**r) for r in data]
+        return self.models(OrgRole, data)
 
     async def create_role(self, org_id_or_name: str, **data: Any) -> dict:
         """Create a new role in the organization"""
@@ -43,7 +43,7 @@ class Orgs(Manager):
         data = await self.cli.get(
             f"{self.url}/{org_id_or_name}/roles/{role_id_or_name}"
         )
-        return OrgRole(**data)
+        return self.model(OrgRole, data)
 
     async def update_role(
         self, org_id_or_name: str, role_id_or_name: str, **data: Any
@@ -52,7 +52,7 @@ class Orgs(Manager):
         payload = await self.cli.patch(
             f"{self.url}/{org_id_or_name}/roles/{role_id_or_name}", json=data
         )
-        return OrgRole(**payload)
+        return self.model(OrgRole, payload)
 
     async def delete_role(self, org_id_or_name: str, role_id_or_name: str) -> None:
         """Delete a role by id or name"""
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from httpx2 import URL
+from httpx2 import Response as ClientResponse
+
+NEXT_CURSOR_HEADERS = ("x-next-cursor", "x-cursor")
+
+Page = tuple[list[Any], str]
+FetchPage = Callable[[str | None], Awaitable[Page]]
+
+
+def next_cursor(response: ClientResponse) -> str:
+    """Cursor of the page following `response`, empty on the last page
+
+    Taken from the `next` link of the `Link` header or, failing that, from a
+    next cursor header.
+    """
+    link = response.links.get("next")
+    if link and link.get("url"):
+        return URL(link["url"]).params.get("cursor", "")
+    for name in NEXT_CURSOR_HEADERS:
+        if cursor := response.headers.get(name):
+            return cursor
+    return ""
+
+
+async def walk_pages(
+    fetch: FetchPage, cursor: str | None = None
+) -> AsyncIterator[list[Any]]:
+    """Fetch cursor pages one after the other, until one has no next cursor"""
+    while True:
+        page, next_ = await fetch(cursor)
+        if page:
+            yield page
+        if not page or not next_ or next_ == cursor:
+            return
+        cursor = next_
+
+
+async def iter_pages(
+    fetch: FetchPage, cursor: str | None = None, prefetch: int = 1
+) -> AsyncIterator[list[Any]]:
+    """Walk cursor pages, fetching up to `prefetch` pages ahead of the consumer
+
+    Cursor pages can only be fetched one after the other, since each cursor
+    comes with the previous page, but a background task keeps fetching while
+    the consumer processes the pages already received. With `prefetch` set to
+    0 a page is only fetched once the previous one has been consumed.
+    """
+    if prefetch < 1:
+        async for page in walk_pages(fetch, cursor):
+            yield page
+        return
+    queue: asyncio.Queue[list[Any] | Exception | None] = asyncio.Queue(prefetch)
+
+    async def produce() -> None:
+        try:
+            async for page in walk_pages(fetch, cursor):
+                await queue.put(page)
+        except Exception as exc:
+            await queue.put(exc)
+        else:
+            await queue.put(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while (item := await queue.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Literal
+
+from pydantic import ValidationError
+
+from .schema import Block, Route
+
+Action = Literal["create", "update", "unchanged"]
+
+# manifest fields the API returns with the block, so they can be compared
+BLOCK_FIELDS = ("upstream", "html", "root", "use_cdn", "acme")
+
+
+@dataclass
+class FieldChange:
+    """A manifest field differing from the block, `current` is None if unknown"""
+
+    field: str
+    current: Any
+    desired: Any
+
+
+@dataclass
+class BlockPlan:
+    """What applying a manifest does to the block of the same name
+
+    `applied`, `duration` and `error` record the outcome once the plan is
+    applied, `applied` being the block returned by the API.
+    """
+
+    name: str
+    config: dict[str, Any]
+    block: Block | None = None
+    changes: list[FieldChange] = field(default_factory=list)
+    applied: Block | None = None
+    duration: float = 0.0
+    error: Exception | None = None
+
+    @property
+    def block_id(self) -> str:
+        block = self.applied or self.block
+        return block.id if block else ""
+
+    @property
+    def action(self) -> Action:
+        if self.block is None:
+            return "create"
+        return "update" if self.changes else "unchanged"
+
+    @property
+    def in_sync(self) -> bool:
+        """Whether the block matches the manifest: it was sent to the API, or
+        every field was compared and none changed"""
+        if self.error is not None:
+            return False
+        return self.applied is not None or self.action == "unchanged"
+
+
+def plan_block(name: str, config: dict[str, Any], block: Block | None) -> BlockPlan:
+    """Plan the manifest `config` of block `name` against the existing `block`"""
+    plan = BlockPlan(name=name, config=config, block=block)
+    if block is not None:
+        plan.changes = diff_block(block, config)
+    return plan
+
+
+def diff_block(block: Block, config: dict[str, Any]) -> list[FieldChange]:
+    """Fields of the manifest `config` which differ from `block`
+
+    Only fields set in the manifest are compared. Routes are matched by name
+    and reported as `routes.<name>` when added or removed, and as
+    `routes.<name>.<field>` when modified. A field the API does not return
+    with the block, such as `tags`, cannot be compared and always counts as
+    changed, as do routes when the block came without them.
+    """
+    changes = []
+    for key, desired in config.items():
+        if key in BLOCK_FIELDS:
+            current = getattr(block, key)
+            if normalize_field(key, current) != normalize_field(key, desired):
+                changes.append(FieldChange(key, current, desired))
+        elif key == "routes" and block.routes is not None:
+            changes.extend(
+                diff_routes(
+                    current_routes_by_name(block), desired_routes_by_name(desired)
+                )
+            )
+        else:
+            changes.append(FieldChange(key, None, desired))
+    return changes
+
+
+def diff_routes(
+    current: dict[str, dict[str, Any]], desired: dict[str, Any]
+) -> list[FieldChange]:
+    changes = []
+    for name, route in desired.items():
+        existing = current.get(name)
+        if existing is None or not isinstance(route, dict):
+            changes.append(FieldChange(f"routes.{name}", existing, route))
+            continue
+        changes.extend(
+            FieldChange(f"routes.{name}.{key}", existing.get(key), value)
+            for key, value in route.items()
+            if existing.get(key) != value
+        )
+    changes.extend(
+        FieldChange(f"routes.{name}", route, None)
+        for name, route in current.items()
+        if name not in desired
+    )
+    return changes
+
+
+def normalize_field(key: str, value: Any) -> Any:
+    if key == "upstream":
+        return str(value or "").rstrip("/")
+    return bool(value)
+
+
+def current_routes_by_name(block: Block) -> dict[str, dict[str, Any]]:
+    return {
+        route.name: Route.model_validate(
+            route.model_dump(include=set(Route.model_fields))
+        ).model_dump(mode="json")
+        for route in block.routes or ()
+    }
+
+
+def desired_routes_by_name(routes: Any) -> dict[str, Any]:
+    """Manifest routes with their defaults filled in, as the API returns them
+
+    A route which is not valid is kept as written, so it shows as changed and
+    the API reports the error when applied.
+    """
+    desired = {}
+    for route in routes or ():
+        try:
+            desired[route["name"]] = Route.model_validate(route).model_dump(mode="json")
+        except (ValidationError, KeyError, TypeError):
+            desired[str(route)] = route
+    return desired
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import gzip
+import time
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from types import ModuleType
+
+from typing_extensions import Annotated, Doc
+
+# text formats served to browsers, which compress well
+TEXT_SUFFIXES = frozenset(
+    (
+        ".html",
+        ".htm",
+        ".css",
+        ".js",
+        ".mjs",
+        ".json",
+        ".map",
+        ".svg",
+        ".xml",
+        ".txt",
+        ".webmanifest",
+        ".wasm",
+    )
+)
+
+# a precompressed file: its suffix, content and the seconds taken
+Variant = tuple[str, bytes, float]
+
+
+@cache
+def brotli_module() -> ModuleType | None:
+    """The `brotli` package, when installed"""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+@dataclass
+class Precompress:
+    """Precompressed `.gz` and `.br` siblings of the text assets of a bundle
+
+    Web servers send a precompressed sibling, when there is one, to clients
+    accepting its encoding, rather than compressing the asset on every
+    response. Since this is done once per deployment, the slowest and
+    smallest settings are the default. `.br` siblings require the `brotli`
+    package and are skipped when it is not installed.
+    """
+
+    min_size: Annotated[int, Doc("Smaller files are not worth compressing")] = 1024
+    suffixes: Annotated[frozenset[str], Doc("Suffixes of the files compressed")] = (
+        TEXT_SUFFIXES
+    )
+    gzip_level: Annotated[int, Doc("gzip level, from 1 to 9")] = 9
+    brotli_quality: Annotated[int, Doc("brotli quality, from 0 to 11")] = 11
+    brotli: Annotated[bool, Doc("Add `.br` siblings, if brotli is installed")] = True
+
+    @property
+    def encodings(self) -> tuple[str, ...]:
+        """Suffixes of the siblings added"""
+        if self.brotli and brotli_module():
+            return (".br", ".gz")
+        return (".gz",)
+
+    def fingerprint(self) -> str:
+        """The settings the siblings depend on, besides the files"""
+        return (
+            f"{self.encodings} {self.min_size} {sorted(self.suffixes)} "
+            f"{self.gzip_level} {self.brotli_quality}"
+        )
+
+    def accepts(self, path: Path) -> bool:
+        """Whether `path` gets precompressed siblings"""
+        return (
+            path.suffix.lower() in self.suffixes
+            and path.stat().st_size >= self.min_size
+        )
+
+    def variants(self, path: Path) -> list[Variant]:
+        """Precompressed siblings of the file at `path`
+
+        Siblings not smaller than the file, or already in the bundle
+        directory, are skipped.
+        """
+        if not self.accepts(path):
+            return []
+        data = path.read_bytes()
+        variants = []
+        for suffix in self.encodings:
+            if path.with_name(f"{path.name}{suffix}").exists():
+                continue
+            start = time.perf_counter()
+            encoded = self.encode(suffix, data)
+            if len(encoded) < len(data):
+                variants.append((suffix, encoded, time.perf_counter() - start))
+        return variants
+
+    def encode(self, suffix: str, data: bytes) -> bytes:
+        if suffix == ".br":
+            brotli = brotli_module()
+            assert brotli is not None
+            return brotli.compress(data, quality=self.brotli_quality)
+        # no timestamp in the header, so the same file compresses the same
+        return gzip.compress(data, self.gzip_level, mtime=0)
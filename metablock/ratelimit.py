@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from typing_extensions import Annotated, Doc
+
+
+@dataclass
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second, holding up to `burst`
+
+    Waiters acquire tokens in arrival order: the lock is held while sleeping so
+    a late caller can never overtake one already waiting for a refill.
+    """
+
+    rate: float
+    burst: float
+    tokens: float = field(init=False)
+    updated: float = field(init=False, default_factory=time.monotonic)
+    paused_until: float = field(init=False, default=0.0)
+    lock: asyncio.Lock = field(init=False, default_factory=asyncio.Lock)
+
+    def __post_init__(self) -> None:
+        self.tokens = self.burst
+
+    async def acquire(self) -> float:
+        """Take a token, returning the seconds spent waiting for it"""
+        async with self.lock:
+            start = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if self.paused_until > now:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.refill()
+                if self.tokens >= 1:
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+            self.tokens -= 1
+            return time.monotonic() - start
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        if now > self.updated:
+            elapsed = now - self.updated
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request back for `seconds`, and drain the bucket"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+        self.updated = self.paused_until
+
+
+@dataclass
+class RateLimiter:
+    """Client side rate limit and cap on requests in flight, per organization
+
+    Limits are applied separately to each organization the client acts within,
+    as selected by the org header, since that is how the API accounts for them.
+    """
+
+    rate: Annotated[
+        float | None, Doc("Requests per second per organization, None for no limit")
+    ] = None
+    burst: Annotated[
+        int | None, Doc("Requests allowed in a burst, defaults to one second's worth")
+    ] = None
+    max_in_flight: Annotated[
+        int | None, Doc("Maximum concurrent requests per organization")
+    ] = None
+    throttled: int = field(init=False, default=0)
+    waited: float = field(init=False, default=0.0)
+    buckets: dict[str, TokenBucket] = field(init=False, default_factory=dict)
+    semaphores: dict[str, asyncio.Semaphore] = field(init=False, default_factory=dict)
+
+    def bucket(self, key: str) -> TokenBucket | None:
+        if not self.rate:
+            return None
+        if key not in self.buckets:
+            burst = self.burst or max(self.rate, 1)
+            self.buckets[key] = TokenBucket(rate=self.rate, burst=burst)
+        return self.buckets[key]
+
+    def semaphore(self, key: str) -> asyncio.Semaphore | None:
+        if not self.max_in_flight:
+            return None
+        if key not in self.semaphores:
+            self.semaphores[key] = asyncio.Semaphore(self.max_in_flight)
+        return self.semaphores[key]
+
+    @asynccontextmanager
+    async def limit(self, key: str) -> AsyncIterator[None]:
+        """Wait for a slot to send a request on behalf of organization `key`"""
+        start = time.monotonic()
+        semaphore = self.semaphore(key)
+        if semaphore:
+            await semaphore.acquire()
+        try:
+            bucket = self.bucket(key)
+            if bucket:
+                await bucket.acquire()
+            waited = time.monotonic() - start
+            if waited > 0.001:
+                self.throttled += 1
+                self.waited += waited
+            yield
+        finally:
+            if semaphore:
+                semaphore.release()
+
+    def pause(self, key: str, seconds: float) -> None:
+        """Pause requests of organization `key`, after the API throttled it"""
+        bucket = self.bucket(key)
+        if bucket:
+            bucket.pause(seconds)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+import jinja2
+import yaml
+
+# the libyaml parser, when pyyaml was built with it, is several times faster
+YamlLoader: type[yaml.SafeLoader] = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# below this many manifests, starting worker processes costs more than it saves
+POOL_THRESHOLD = 200
+
+ManifestItem = tuple[Path, dict[str, Any]]
+
+
+@cache
+def environment(directory: str) -> jinja2.Environment:
+    """Jinja environment loading the templates of `directory`
+
+    Environments are cached per directory, so every template is compiled
+    once per process. Compiled templates are also kept in an on-disk bytecode
+    cache, shared by the worker processes and by later runs.
+    """
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(directory),
+        bytecode_cache=jinja2.FileSystemBytecodeCache(),
+    )
+
+
+def render_manifest(file_path: Path, params: dict[str, Any]) -> str:
+    """Render the manifest template at `file_path`"""
+    env = environment(str(file_path.parent.resolve()))
+    return env.get_template(file_path.name).render(**params)
+
+
+def load_yaml(text: str) -> Any:
+    return yaml.load(text, Loader=YamlLoader)
+
+
+def load_manifest(
+    file_path: Path, params: dict[str, Any], parse: bool = True
+) -> tuple[str, Any]:
+    """Render the manifest at `file_path` and parse it, unless `parse` is off"""
+    text = render_manifest(file_path, params)
+    return text, load_yaml(text) if parse else None
+
+
+def load_manifests(
+    items: list[ManifestItem], jobs: int = 0, parse: bool = True
+) -> list[tuple[str, Any]]:
+    """Render and parse manifests, in `jobs` worker processes
+
+    With `jobs` set to 0 a process per CPU is used, once there are enough
+    manifests to pay for starting them. Results are in the order of `items`.
+    """
+    if not jobs:
+        jobs = (os.cpu_count() or 1) if len(items) >= POOL_THRESHOLD else 1
+    if jobs < 2 or len(items) < 2:
+        return [load_manifest(path, params, parse) for path, params in items]
+    chunksize = max(1, len(items) // (jobs * 4))
+    with ProcessPoolExecutor(jobs) as pool:
+        return list(
+            pool.map(
+                load_manifest,
+                [path for path, _ in items],
+                [params for _, params in items],
+                [parse] * len(items),
+                chunksize=chunksize,
+            )
+        )
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable
+
+from httpx2 import ConnectError, ConnectTimeout, PoolTimeout, TransportError
+from httpx2 import Response as ClientResponse
+from typing_extensions import Annotated, Doc
+
+logger = logging.getLogger("metablock.retry")
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+# failures raised before the request reaches the server, safe for any method
+UNSENT_ERRORS = (ConnectError, ConnectTimeout, PoolTimeout)
+
+
+@dataclass
+class RetryStats:
+    """Counters of the requests sent through a retry policy"""
+
+    requests: int = 0
+    attempts: int = 0
+    retries: int = 0
+    exhausted: int = 0
+    statuses: dict[int, int] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def amplification(self) -> float:
+        """Average number of attempts per request"""
+        return self.attempts / self.requests if self.requests else 0.0
+
+
+@dataclass
+class RetryPolicy:
+    """Retry failed requests with exponential backoff and jitter
+
+    Responses with a status in `statuses` and transport errors are retried for
+    the `methods` listed, which are the idempotent ones by default. Connection
+    failures are retried for any method since the request never left the
+    client.
+    """
+
+    max_attempts: Annotated[
+        int, Doc("Maximum number of attempts, including the first one")
+    ] = 3
+    backoff: Annotated[float, Doc("Base delay in seconds of the backoff")] = 0.5
+    backoff_max: Annotated[float, Doc("Maximum delay in seconds between attempts")] = (
+        30.0
+    )
+    jitter: Annotated[
+        bool, Doc("Randomize delays (full jitter) to spread retries of many clients")
+    ] = True
+    retry_after: Annotated[
+        bool, Doc("Honour the `Retry-After` header, capped at `backoff_max`")
+    ] = True
+    methods: Annotated[frozenset[str], Doc("HTTP methods which can be retried")] = (
+        IDEMPOTENT_METHODS
+    )
+    statuses: Annotated[frozenset[int], Doc("Response statuses to retry")] = (
+        RETRY_STATUSES
+    )
+
+    def can_retry(self, method: str, attempt: int) -> bool:
+        return attempt < self.max_attempts and method.upper() in self.methods
+
+    def delay(self, attempt: int, response: ClientResponse | None = None) -> float:
+        """Seconds to wait before the attempt following `attempt`"""
+        if response is not None and self.retry_after:
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        delay = min(self.backoff * 2 ** (attempt - 1), self.backoff_max)
+        return random.uniform(0, delay) if self.jitter else delay
+
+    async def run(
+        self,
+        method: str,
+        url: str,
+        send: Callable[[], Awaitable[ClientResponse]],
+        stats: RetryStats | None = None,
+    ) -> ClientResponse:
+        """Call `send` until it succeeds, fails for good or attempts run out"""
+        stats = stats if stats is not None else RetryStats()
+        stats.requests += 1
+        attempt = 0
+        while True:
+            attempt += 1
+            stats.attempts += 1
+            try:
+                response = await send()
+            except TransportError as exc:
+                name = type(exc).__name__
+                stats.errors[name] = stats.errors.get(name, 0) + 1
+                if attempt >= self.max_attempts:
+                    stats.exhausted += 1
+                    raise
+                if not isinstance(exc, UNSENT_ERRORS) and not self.can_retry(
+                    method, attempt
+                ):
+                    raise
+                delay = self.delay(attempt)
+                reason = name
+            else:
+                if response.status_code not in self.statuses:
+                    return response
+                status = response.status_code
+                stats.statuses[status] = stats.statuses.get(status, 0) + 1
+                if not self.can_retry(method, attempt):
+                    if attempt >= self.max_attempts:
+                        stats.exhausted += 1
+                    return response
+                delay = self.delay(attempt, response)
+                reason = str(status)
+                await response.aclose()
+            stats.retries += 1
+            logger.info(
+                "retry %s %s in %.2f seconds after %s (attempt %d of %d)",
+                method,
+                url,
+                delay,
+                reason,
+                attempt,
+                self.max_attempts,
+            )
+            await asyncio.sleep(delay)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a `Retry-After` header, either delay seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable
+
+
+@dataclass
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key
+
+    The first caller starts the call as a task and later callers with the same
+    key await that task rather than starting their own. The task is shielded,
+    so a caller giving up does not cancel the call for the others, and it is
+    forgotten as soon as it completes: results are shared, never cached.
+    """
+
+    calls: dict[Hashable, asyncio.Future] = field(default_factory=dict)
+    shared: int = field(default=0)
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self.calls[key] = future
+            future.add_done_callback(lambda f: self.done(key, f))
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def done(self, key: Hashable, future: asyncio.Future) -> None:
+        if self.calls.get(key) is future:
+            self.calls.pop(key)
+        # mark the exception retrieved, in case every caller was cancelled
+        if not future.cancelled():
+            future.exception()
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Any, ClassVar
+from typing import Any, AsyncIterator, ClassVar, Iterable, Mapping
 
+from httpx2 import TransportError
 from typing_extensions import Annotated, Doc
 
-from .components import Callback, Manager
+from .bulk import DEFAULT_CONCURRENCY, AdaptiveConcurrency, BulkResult, run_bulk
+from .bundle import BundleStats, CompressionPolicy, IgnoreRules, stream_zip
+from .components import Callback, Manager, MetablockResponseError
+from .precompress import Precompress
 from .schema import (
     Block,
     Certificate,
@@ -15,6 +21,13 @@ from .schema import (
     SpaceExtension,
     SpaceNameServers,
 )
+from .upload import (
+    RESUMABLE_STATUSES,
+    UPLOAD_CHUNK_SIZE,
+    MultipartBody,
+    content_range,
+    read_chunk,
+)
 from .utils import Filter, compact_dict, filter_as_tuple
 
 
@@ -27,27 +40,27 @@ class Spaces(Manager):
     async def get_list(self, **kwargs: Any) -> list[Space]:
         """Get the list of spaces in the organization"""
         data = await self.cli.get(self.url, **kwargs)
-        return [Space(**s) for s in data]
+        return self.models(Space, data)
 
     async def create(self, **data: Any) -> Space:
         """Create a new space in the organization"""
         payload = await self.cli.post(self.url, json=data)
-        return Space(**payload)
+        return self.model(Space, payload)
 
     async def get(self, space_id_or_name: str) -> Space:
         """Get a space by id or name"""
         data = await self.cli.get(f"{self.url}/{space_id_or_name}")
-        return Space(**data)
+        return self.model(Space, data)
 
     async def update(self, space_id_or_name: str, **kwargs: Any) -> Space:
         """Update a space by id or name"""
         data = await self.cli.patch(f"{self.url}/{space_id_or_name}", json=kwargs)
-        return Space(**data)
+        return self.model(Space, data)
 
     async def nameservers(self, space_id_or_name: str) -> SpaceNameServers:
         """Get the nameservers to configure at the domain registrar"""
         data = await self.cli.get(f"{self.url}/{space_id_or_name}/nameservers")
-        return SpaceNameServers(**data)
+        return self.model(SpaceNameServers, data)
 
     async def blocks(
         self,
@@ -63,7 +76,24 @@ class Spaces(Manager):
             params=compact_dict(name=filter_as_tuple(name), html=html),
             **kwargs,
         )
-        return [Block(**d) for d in data]
+        return self.models(Block, data)
+
+    async def stream_blocks(
+        self,
+        space_id_or_name: str,
+        *,
+        name: Annotated[Filter[str] | None, Doc("Filter by block name")] = None,
+        html: Annotated[bool | None, Doc("Filter by HTML blocks")] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Block]:
+        """Stream the blocks in the space, decoded as they are received"""
+        async for block in self.stream_models(
+            Block,
+            f"{self.url}/{space_id_or_name}/blocks",
+            params=compact_dict(name=filter_as_tuple(name), html=html),
+            **kwargs,
+        ):
+            yield block
 
     async def create_block(
         self, space_id_or_name: str, name: str, **kwargs: Any
@@ -73,12 +103,33 @@ class Spaces(Manager):
             f"{self.url}/{space_id_or_name}/blocks",
             json=dict(name=name, **kwargs),
         )
-        return Block(**data)
+        return self.model(Block, data)
+
+    async def create_blocks(
+        self,
+        space_id_or_name: str,
+        blocks: Annotated[
+            Iterable[dict[str, Any]], Doc("Blocks to create, each with its name")
+        ],
+        *,
+        concurrency: Annotated[
+            int | AdaptiveConcurrency,
+            Doc("Maximum requests in flight, or an adaptive controller"),
+        ] = DEFAULT_CONCURRENCY,
+    ) -> list[BulkResult[Block]]:
+        """Create many blocks in the space concurrently, keyed by block name"""
+        return await run_bulk(
+            (
+                (block["name"], partial(self.create_block, space_id_or_name, **block))
+                for block in blocks
+            ),
+            concurrency,
+        )
 
     async def extensions(self, space_id_or_name: str) -> list[SpaceExtension]:
         """Get a list of extensions in the space"""
         data = await self.cli.get(f"{self.url}/{space_id_or_name}/extensions")
-        return [SpaceExtension(**e) for e in data]
+        return self.models(SpaceExtension, data)
 
     async def add_extension(
         self, space_id_or_name: str, name: str, config: dict | None = None
@@ -88,7 +139,7 @@ class Spaces(Manager):
             f"{self.url}/{space_id_or_name}/extensions",
             json=dict(name=name, config=config or {}),
         )
-        return SpaceExtension(**data)
+        return self.model(SpaceExtension, data)
 
 
 @dataclass
@@ -100,21 +151,71 @@ class Blocks(Manager):
     async def get(self, block_id: str) -> Block:
         """Get a block by id"""
         data = await self.cli.get(f"{self.url}/{block_id}")
-        return Block(**data)
+        return self.model(Block, data)
 
     async def update(self, block_id: str, **kwargs: Any) -> Block:
         """Update a block by id"""
         data = await self.cli.patch(f"{self.url}/{block_id}", json=kwargs)
-        return Block(**data)
+        return self.model(Block, data)
 
     async def delete(self, block_id: str) -> None:
         """Delete a block by id"""
         await self.cli.delete(f"{self.url}/{block_id}")
 
+    async def get_many(
+        self,
+        block_ids: Iterable[str],
+        *,
+        concurrency: Annotated[
+            int | AdaptiveConcurrency,
+            Doc("Maximum requests in flight, or an adaptive controller"),
+        ] = DEFAULT_CONCURRENCY,
+    ) -> list[BulkResult[Block]]:
+        """Get many blocks concurrently, keyed by block id"""
+        return await run_bulk(
+            ((block_id, partial(self.get, block_id)) for block_id in block_ids),
+            concurrency,
+        )
+
+    async def update_many(
+        self,
+        updates: Annotated[
+            Mapping[str, dict[str, Any]], Doc("Fields to update by block id")
+        ],
+        *,
+        concurrency: Annotated[
+            int | AdaptiveConcurrency,
+            Doc("Maximum requests in flight, or an adaptive controller"),
+        ] = DEFAULT_CONCURRENCY,
+    ) -> list[BulkResult[Block]]:
+        """Update many blocks concurrently, keyed by block id"""
+        return await run_bulk(
+            (
+                (block_id, partial(self.update, block_id, **fields))
+                for block_id, fields in updates.items()
+            ),
+            concurrency,
+        )
+
+    async def delete_many(
+        self,
+        block_ids: Iterable[str],
+        *,
+        concurrency: Annotated[
+            int | AdaptiveConcurrency,
+            Doc("Maximum requests in flight, or an adaptive controller"),
+        ] = DEFAULT_CONCURRENCY,
+    ) -> list[BulkResult[None]]:
+        """Delete many blocks concurrently, keyed by block id"""
+        return await run_bulk(
+            ((block_id, partial(self.delete, block_id)) for block_id in block_ids),
+            concurrency,
+        )
+
     async def certificate(self, block_id: str) -> Certificate:
         """Get the TLS certificate of a block"""
         data = await self.cli.get(f"{self.url}/{block_id}/certificate")
-        return Certificate(**data)
+        return self.model(Certificate, data)
 
     async def deployments(
         self,
@@ -129,7 +230,41 @@ class Blocks(Manager):
             f"{self.url}/{block_id}/deployments",
             params=compact_dict(env=env, limit=limit, cursor=cursor),
         )
-        return [Deployment(**d) for d in data]
+        return self.models(Deployment, data)
+
+    async def iter_deployments(
+        self,
+        block_id: str,
+        *,
+        env: Annotated[str | None, Doc("Filter by deployment environment")] = None,
+        limit: Annotated[int | None, Doc("Number of deployments per page")] = None,
+        cursor: Annotated[str | None, Doc("Cursor to start from")] = None,
+        prefetch: Annotated[int, Doc("Pages fetched ahead of the consumer")] = 1,
+    ) -> AsyncIterator[Deployment]:
+        """Iterate over all the deployments of the block, page by page"""
+        async for deployment in self.iter_models(
+            Deployment,
+            f"{self.url}/{block_id}/deployments",
+            compact_dict(env=env, limit=limit, cursor=cursor),
+            prefetch=prefetch,
+        ):
+            yield deployment
+
+    async def stream_deployments(
+        self,
+        block_id: str,
+        *,
+        env: Annotated[str | None, Doc("Filter by deployment environment")] = None,
+        limit: Annotated[int | None, Doc("Maximum number of deployments")] = None,
+        cursor: Annotated[str | None, Doc("Cursor for pagination")] = None,
+    ) -> AsyncIterator[Deployment]:
+        """Stream the deployments of the block, decoded as they are received"""
+        async for deployment in self.stream_models(
+            Deployment,
+            f"{self.url}/{block_id}/deployments",
+            params=compact_dict(env=env, limit=limit, cursor=cursor),
+        ):
+            yield deployment
 
     async def ship(
         self,
@@ -137,17 +272,125 @@ class Blocks(Manager):
         bundle_path: str | Path,
         name: str = "",
         env: str = "stage",
+        *,
+        jobs: Annotated[
+            int, Doc("Threads compressing a directory bundle, 0 for one per CPU")
+        ] = 1,
+        policy: Annotated[
+            CompressionPolicy | None, Doc("Compression of a directory bundle")
+        ] = None,
+        stats: Annotated[
+            BundleStats | None, Doc("Records the compression of a directory bundle")
+        ] = None,
+        ignore: Annotated[
+            IgnoreRules | None,
+            Doc(
+                "Files left out of a directory bundle, by default its .metablockignore"
+            ),
+        ] = None,
+        precompress: Annotated[
+            Precompress | None,
+            Doc("Adds precompressed siblings of the text assets of a directory"),
+        ] = None,
         **kwargs: Any,
     ) -> dict:
-        """Deploy a bundle to the block"""
+        """Deploy a bundle to the block
+
+        The bundle is streamed from disk in chunks, so memory stays flat
+        whatever its size. When `bundle_path` is a directory, it is zipped
+        while it is uploaded, with no temporary file.
+        """
         p = Path(bundle_path)
+        fields = dict(name=name, env=env)
+        if p.is_dir():
+            body = MultipartBody(
+                source=partial(
+                    stream_zip,
+                    p,
+                    jobs=jobs,
+                    policy=policy,
+                    stats=stats,
+                    ignore=ignore,
+                    precompress=precompress,
+                ),
+                filename=f"{p.name}.zip",
+                fields=fields,
+                name="bundle",
+                content_type="application/zip",
+            )
+        else:
+            body = MultipartBody.from_file(p, fields=fields, name="bundle")
         return await self.cli.post(
             f"{self.url}/{block_id}/deployments",
-            data=dict(name=name, env=env),
-            files=dict(bundle=(p.name, p.read_bytes())),
+            content=body,
+            headers=body.headers,
             **kwargs,
         )
 
+    async def ship_chunked(
+        self,
+        block_id: str,
+        bundle_path: str | Path,
+        name: str = "",
+        env: str = "stage",
+        *,
+        chunk_size: Annotated[int, Doc("Bytes sent per request")] = UPLOAD_CHUNK_SIZE,
+        upload_id: Annotated[
+            str, Doc("Id of an upload to resume, left by a previous attempt")
+        ] = "",
+        max_resumes: Annotated[
+            int, Doc("Consecutive failed chunks after which the upload gives up")
+        ] = 5,
+        **kwargs: Any,
+    ) -> dict:
+        """Deploy a bundle file to the block in chunks, resuming after failures
+
+        Experimental: it needs upload endpoints the metablock API does not
+        provide yet, and fails with a 404 until it does.
+
+        The upload is created with `POST .../uploads`, then each chunk is sent
+        with `PUT .../uploads/{id}` and a `content-range` header, and the
+        response to the last one is the deployment. A failed chunk is retried
+        by the client retry policy; when it fails for good, the upload asks
+        the server how many bytes it has, with `GET .../uploads/{id}`, and
+        resumes from that offset, so only what is missing is sent again.
+        """
+        p = Path(bundle_path)
+        size = p.stat().st_size
+        url = f"{self.url}/{block_id}/uploads"
+        if upload_id:
+            upload = await self.cli.get(f"{url}/{upload_id}")
+        else:
+            upload = await self.cli.post(
+                url, json=dict(name=name, env=env, filename=p.name, size=size)
+            )
+        upload_url = f"{url}/{upload['id']}"
+        offset = reached = upload["offset"]
+        failures = 0
+        while True:
+            chunk = await asyncio.to_thread(read_chunk, p, offset, chunk_size)
+            try:
+                data = await self.cli.put(
+                    upload_url,
+                    content=chunk,
+                    headers={"content-range": content_range(offset, len(chunk), size)},
+                    **kwargs,
+                )
+            except (TransportError, MetablockResponseError) as exc:
+                failures += 1
+                if failures > max_resumes or not (
+                    isinstance(exc, TransportError) or exc.status in RESUMABLE_STATUSES
+                ):
+                    raise
+                offset = (await self.cli.get(upload_url))["offset"]
+                continue
+            if offset + len(chunk) >= size:
+                return data
+            offset = data["offset"]
+            # failures only reset when the upload gets further than before
+            if offset > reached:
+                reached, failures = offset, 0
+
     async def add_route(
         self, block_id: str, *, callback: Callback | None = None, **kwargs: Any
     ) -> dict:
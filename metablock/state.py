@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from typing_extensions import Annotated, Doc
+
+STATE_VERSION = 1
+
+
+@dataclass
+class ApplyState:
+    """Local record of the manifests applied to each space
+
+    For every block it keeps the hash of the rendered manifest last applied
+    successfully and the id of the block, so a later apply can skip the
+    manifests which did not change without asking the API. Changes made to
+    the blocks outside of `apply` are not noticed until a refresh.
+    """
+
+    path: Annotated[Path, Doc("Path of the JSON state file")]
+    spaces: dict[str, dict[str, dict[str, str]]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str | Path) -> ApplyState:
+        """Load the state file at `path`, empty if missing or unreadable"""
+        state = cls(Path(path))
+        try:
+            data = json.loads(state.path.read_text())
+        except (OSError, ValueError):
+            return state
+        if isinstance(data, dict) and data.get("version") == STATE_VERSION:
+            state.spaces = data.get("spaces") or {}
+        return state
+
+    def save(self) -> None:
+        """Write the state, replacing the file atomically"""
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        tmp.write_text(
+            json.dumps(
+                dict(version=STATE_VERSION, spaces=self.spaces),
+                indent=2,
+                sort_keys=True,
+            )
+        )
+        os.replace(tmp, self.path)
+
+    def unchanged(self, space: str, name: str, digest: str) -> bool:
+        """Whether the manifest of block `name` was applied with this `digest`"""
+        entry = self.spaces.get(space, {}).get(name)
+        return entry is not None and entry.get("hash") == digest
+
+    def record(self, space: str, name: str, digest: str, block_id: str) -> None:
+        """Record the manifest of block `name` as applied"""
+        self.spaces.setdefault(space, {})[name] = dict(hash=digest, block_id=block_id)
+
+    def forget(self, space: str, name: str) -> None:
+        """Drop block `name`, so its manifest is applied on the next run"""
+        self.spaces.get(space, {}).pop(name, None)
+
+
+def manifest_hash(text: str) -> str:
+    """Content hash of a rendered manifest"""
+    return hashlib.sha256(text.encode()).hexdigest()
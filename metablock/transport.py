@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from httpx2 import AsyncClient, AsyncHTTPTransport, Limits
+from typing_extensions import Annotated, Doc
+
+
+@dataclass
+class TransportConfig:
+    """Connection pool and protocol settings for the client session
+
+    The defaults match those of `httpx2.AsyncClient`, so a client created without
+    a configuration behaves exactly as before.
+    """
+
+    max_connections: Annotated[
+        int | None, Doc("Maximum number of concurrent connections, None for no cap")
+    ] = 100
+    max_keepalive_connections: Annotated[
+        int | None, Doc("Maximum number of idle connections kept in the pool")
+    ] = 20
+    keepalive_expiry: Annotated[
+        float | None, Doc("Seconds an idle connection is kept alive")
+    ] = 5.0
+    http2: Annotated[
+        bool, Doc("Negotiate HTTP/2, requires the `http2` extra (`h2` package)")
+    ] = False
+    timeout: Annotated[
+        float | None, Doc("Default timeout in seconds for every request")
+    ] = 5.0
+    host_limits: Annotated[
+        dict[str, int],
+        Doc(
+            "Maximum connections per host, keyed by URL pattern such as "
+            "`https://api.metablock.io`; each pattern gets a pool of its own"
+        ),
+    ] = field(default_factory=dict)
+
+    @property
+    def limits(self) -> Limits:
+        return self.host_pool_limits(self.max_connections)
+
+    def host_pool_limits(self, max_connections: int | None) -> Limits:
+        max_keepalive = self.max_keepalive_connections
+        if max_connections is not None and max_keepalive is not None:
+            max_keepalive = min(max_keepalive, max_connections)
+        return Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def create_session(self) -> AsyncClient:
+        """Create a new `AsyncClient` configured with these settings"""
+        mounts = {
+            pattern: AsyncHTTPTransport(
+                limits=self.host_pool_limits(max_connections), http2=self.http2
+            )
+            for pattern, max_connections in self.host_limits.items()
+        }
+        return AsyncClient(
+            limits=self.limits,
+            http2=self.http2,
+            timeout=self.timeout,
+            mounts=mounts or None,
+        )
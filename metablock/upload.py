@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import mimetypes
+import secrets
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, Callable
+
+from typing_extensions import Annotated, Doc
+
+CHUNK_SIZE = 256 * 1024
+# bytes sent per request by chunked uploads
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# responses to a chunk after which the upload can resume, 409 being sent when
+# the chunk does not start at the offset the server has received
+RESUMABLE_STATUSES = frozenset((408, 409, 429, 500, 502, 503, 504))
+
+Source = Callable[[], AsyncIterator[bytes]]
+
+
+async def iter_file(
+    path: Path, chunk_size: int = CHUNK_SIZE, offset: int = 0
+) -> AsyncIterator[bytes]:
+    """Read the file at `path` from `offset` in chunks, off the event loop"""
+    with path.open("rb") as file:
+        file.seek(offset)
+        while chunk := await asyncio.to_thread(file.read, chunk_size):
+            yield chunk
+
+
+def read_chunk(path: Path, offset: int, size: int) -> bytes:
+    """Read up to `size` bytes of the file at `path` from `offset`"""
+    with path.open("rb") as file:
+        file.seek(offset)
+        return file.read(size)
+
+
+def content_range(offset: int, length: int, size: int) -> str:
+    """`content-range` header of `length` bytes from `offset` of `size` bytes"""
+    if not length:
+        return f"bytes */{size}"
+    return f"bytes {offset}-{offset + length - 1}/{size}"
+
+
+@dataclass
+class MultipartBody:
+    """A `multipart/form-data` body with one file, streamed as it is read
+
+    Only one chunk of the file is in memory at a time and the first bytes are
+    sent straight away. The body can be iterated again, reading the file from
+    the start, so a request sending it can be retried.
+    """
+
+    source: Annotated[Source, Doc("Opens a new iterator over the file bytes")]
+    filename: Annotated[str, Doc("Name of the file sent")]
+    fields: Annotated[dict[str, str], Doc("Form fields sent before the file")] = field(
+        default_factory=dict
+    )
+    name: Annotated[str, Doc("Form field of the file")] = "file"
+    size: Annotated[int | None, Doc("Size of the file, if known")] = None
+    content_type: str = "application/octet-stream"
+    boundary: str = field(default_factory=lambda: secrets.token_hex(16))
+
+    @classmethod
+    def from_file(
+        cls,
+        path: str | Path,
+        fields: dict[str, str] | None = None,
+        name: str = "file",
+        chunk_size: int = CHUNK_SIZE,
+    ) -> MultipartBody:
+        """Body streaming the file at `path` in chunks of `chunk_size` bytes"""
+        p = Path(path)
+        return cls(
+            source=partial(iter_file, p, chunk_size),
+            filename=p.name,
+            fields=fields or {},
+            name=name,
+            size=p.stat().st_size,
+            content_type=mimetypes.guess_type(p.name)[0] or cls.content_type,
+        )
+
+    @property
+    def headers(self) -> dict[str, str]:
+        """Content headers, with the length when the file size is known"""
+        headers = {"content-type": f"multipart/form-data; boundary={self.boundary}"}
+        if self.size is not None:
+            headers["content-length"] = str(
+                len(self.head()) + self.size + len(self.tail())
+            )
+        return headers
+
+    def head(self) -> bytes:
+        parts = [
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="'
+            f'{quote(key)}"\r\n\r\n{value}\r\n'
+            for key, value in self.fields.items()
+        ]
+        parts.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="'
+            f'{quote(self.name)}"; filename="{quote(self.filename)}"\r\n'
+            f"Content-Type: {self.content_type}\r\n\r\n"
+        )
+        return "".join(parts).encode()
+
+    def tail(self) -> bytes:
+        return f"\r\n--{self.boundary}--\r\n".encode()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self.head()
+        async for chunk in self.source():
+            yield chunk
+        yield self.tail()
+
+
+def quote(value: str) -> str:
+    """Escape a multipart header parameter, as browsers do"""
+    return value.replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
@@ -16,12 +16,12 @@ class Users(Manager):
     async def get(self, **kwargs: Any) -> User:
         """Get the user associated with the API token"""
         data = await self.cli.get(self.url, **kwargs)
-        return User(**data)
+        return self.model(User, data)
 
     async def update(self, **data: Any) -> User:
         """Update the authenticated user"""
         payload = await self.cli.patch(self.url, json=data)
-        return User(**payload)
+        return self.model(User, payload)
 
     async def delete(self) -> None:
         """Delete the authenticated user"""
@@ -30,17 +30,17 @@ class Users(Manager):
     async def orgs(self, **kwargs: Any) -> list[OrgMember]:
         """List the organizations the user belongs to"""
         data = await self.cli.get(f"{self.url}/orgs", **kwargs)
-        return [OrgMember(**o) for o in data]
+        return self.models(OrgMember, data)
 
     async def tokens(self, **kwargs: Any) -> list[ApiToken]:
         """List the user API tokens"""
         data = await self.cli.get(f"{self.url}/tokens", **kwargs)
-        return [ApiToken(**t) for t in data]
+        return self.models(ApiToken, data)
 
     async def create_token(self, **data: Any) -> ApiToken:
         """Create a new API token for the user"""
         payload = await self.cli.post(f"{self.url}/tokens", json=data)
-        return ApiToken(**payload)
+        return self.model(ApiToken, payload)
 
     async def delete_token(self, token_id: str) -> None:
         """Delete one of the user API tokens"""
@@ -1,10 +1,12 @@
-import zipfile
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Any, Hashable, Iterable, Iterator, TypeAlias, TypeVar
 
 from multidict import MultiDict
 
+from .bundle import BundleStats, CompressionPolicy, IgnoreRules, write_zip
+from .precompress import Precompress
+
 DEFAULT_SKIP_VALUES = frozenset((None,))
 
 T = TypeVar("T")
@@ -45,8 +47,15 @@ def compact_dict(
 
 
 @contextmanager
-def temp_zipfile(path: str | Path) -> Iterator[Path]:
-    """Create a temporary zip file."""
+def temp_zipfile(
+    path: str | Path,
+    jobs: int = 1,
+    policy: CompressionPolicy | None = None,
+    stats: BundleStats | None = None,
+    ignore: IgnoreRules | None = None,
+    precompress: Precompress | None = None,
+) -> Iterator[Path]:
+    """Create a temporary zip file, compressed by `jobs` threads."""
     p = Path(path)
     if not p.is_dir():
         raise ValueError(f"Path {p} is not a directory")
@@ -54,10 +63,7 @@ def temp_zipfile(path: str | Path) -> Iterator[Path]:
     # Create a zip file from the directory
     zip_path = p.with_suffix(".zip")
     try:
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for file in p.rglob("*"):  # Recursively add all files in the directory
-                arcname = file.relative_to(p)  # Preserve relative paths in the archive
-                zipf.write(file, arcname)
+        write_zip(p, zip_path, jobs, policy, stats, ignore, precompress)
         yield zip_path
     finally:
         # Clean up the zip file after shipping
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from email import message_from_bytes
+from email.policy import HTTP
+from typing import Any, Awaitable, Callable
+
+from httpx2 import AsyncClient, MockTransport, Request, Response
+
+from metablock import Metablock
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+SPACE = dict(id="s1", name="mblock", domain="mblock.test", org_id="o1", org_name="o")
+
+
+@dataclass
+class LocalApi:
+    """In-process stand-in for the metablock API
+
+    The live API cannot be asked to fail on demand, so tests covering how the
+    client reacts to failures route its session to `handler` instead. Every
+    request received is recorded in `requests`.
+    """
+
+    handler: Handler
+    url: str = "https://api.metablock.test/v1"
+    requests: list[Request] = field(default_factory=list)
+
+    def client(self, **kwargs: Any) -> Metablock:
+        session = AsyncClient(transport=MockTransport(self.handle))
+        return Metablock(url=self.url, auth_key="test", session=session, **kwargs)
+
+    @staticmethod
+    def json(request: Request) -> Any:
+        """Decoded JSON body of a request"""
+        return json.loads(request.content)
+
+    async def handle(self, request: Request) -> Response:
+        self.requests.append(request)
+        return await self.handler(request)
+
+
+def block(block_id: str, **fields: Any) -> dict:
+    """A block of the `SPACE` stand-in, as the API returns it"""
+    return dict(
+        id=block_id,
+        service_id="v1",
+        name=fields.get("name", block_id),
+        space=SPACE,
+        full_name=f"mblock-{block_id}",
+        html=False,
+        root=False,
+        use_cdn=False,
+        domain=f"{block_id}.mblock.test",
+        url=f"https://{block_id}.mblock.test",
+        upstream=fields.get("upstream", ""),
+    )
+
+
+def parts(request: Request) -> dict:
+    """Form fields of a multipart request, by name"""
+    message = message_from_bytes(
+        f"content-type: {request.headers['content-type']}\r\n\r\n".encode()
+        + request.content,
+        policy=HTTP,
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part
+        for part in message.iter_parts()  # type: ignore[attr-defined]
+    }
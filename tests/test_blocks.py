@@ -1,7 +1,10 @@
+import sys
+
 import pytest
 
-from metablock import Metablock
-from metablock.schema import Block
+from metablock import Metablock, MetablockResponseError
+from metablock.components import list_adapter
+from metablock.schema import Block, Deployment
 
 pytestmark = pytest.mark.asyncio(loop_scope="module")
 
@@ -35,3 +38,43 @@ async def test_space_nameservers(cli: Metablock) -> None:
     spaces = await cli.spaces.get_list()
     nameservers = await cli.spaces.nameservers(spaces[0].id)
     assert nameservers.domain
+
+
+async def test_deployments_validated_as_list(cli: Metablock, block: Block) -> None:
+    deployments = await cli.blocks.deployments(block.id)
+    assert all(isinstance(d, Deployment) for d in deployments)
+    assert list_adapter(Deployment) is list_adapter(Deployment)
+
+
+async def test_stream_block_deployments(cli: Metablock, block: Block) -> None:
+    deployments = await cli.blocks.deployments(block.id)
+    streamed = [d async for d in cli.blocks.stream_deployments(block.id)]
+    assert [d.id for d in streamed] == [d.id for d in deployments]
+
+
+async def test_get_many(cli: Metablock, block: Block) -> None:
+    results = await cli.blocks.get_many([block.id, "missing"])
+    assert [r.key for r in results] == [block.id, "missing"]
+    assert results[0].value and results[0].value.id == block.id
+    error = results[1].error
+    assert isinstance(error, MetablockResponseError)
+    assert error.status == 404
+
+
+async def test_create_and_delete_many(cli: Metablock) -> None:
+    # names unique to the interpreter, as the CI matrix runs the live suite
+    # on several Python versions at once
+    version = f"py{sys.version_info.major}{sys.version_info.minor}"
+    names = [f"bulk{index}-{version}" for index in range(3)]
+    # blocks left behind by an interrupted run
+    left = [b.id for b in await cli.spaces.blocks("mblock") if b.name in names]
+    await cli.blocks.delete_many(left)
+    created = await cli.spaces.create_blocks(
+        "mblock", [dict(name=name, upstream=f"https://{name}.test") for name in names]
+    )
+    block_ids = [r.value.id for r in created if r.value]
+    deleted = await cli.blocks.delete_many(block_ids)
+    assert [r.key for r in created if r.ok] == names
+    assert all(r.ok for r in deleted)
+    remaining = {b.id for b in await cli.spaces.blocks("mblock")}
+    assert not remaining.intersection(block_ids)
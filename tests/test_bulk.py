@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from httpx2 import Request, Response
+
+from metablock import MetablockResponseError
+from metablock.bulk import AdaptiveConcurrency, run_bulk
+from tests.local import LocalApi, block
+
+
+class Blocks:
+    """Handler for block requests, failing for the missing block"""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, request: Request) -> Response:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.005)
+        self.in_flight -= 1
+        block_id = request.url.path.split("/")[-1]
+        if block_id == "missing":
+            return Response(404, json={"message": "block not found"})
+        if request.method == "DELETE":
+            return Response(204)
+        fields = {}
+        if request.content:
+            fields = LocalApi.json(request)
+        if request.method == "POST":
+            block_id = fields["name"]
+        return Response(200, json=block(block_id, **fields))
+
+
+async def test_update_many():
+    handler = Blocks()
+    cli = LocalApi(handler).client()
+    updates = {f"b{i}": dict(upstream=f"https://b{i}.test") for i in range(20)}
+    updates["missing"] = dict(upstream="https://missing.test")
+    results = await cli.blocks.update_many(updates, concurrency=4)
+    assert [r.key for r in results] == list(updates)
+    assert handler.peak == 4
+    failed = [r for r in results if not r.ok]
+    assert [r.key for r in failed] == ["missing"]
+    assert isinstance(failed[0].error, MetablockResponseError)
+    assert results[3].value and results[3].value.upstream == "https://b3.test"
+
+
+async def test_run_bulk_empty():
+    assert await run_bulk([]) == []
+
+
+def test_aimd_window():
+    controller = AdaptiveConcurrency(initial=4, maximum=8)
+    for _ in range(4):
+        controller.observe(0.01, 200)
+    assert controller.limit == 5
+    controller.observe(0.01, 429)
+    assert controller.limit == 2
+    # one overload per baseline latency: the burst of 503s counts once
+    controller.latency = 10
+    controller.observe(0.01, 503)
+    assert controller.limit == 2
+    assert controller.decreases == 1
+
+
+def test_aimd_latency_spike():
+    controller = AdaptiveConcurrency(initial=8, latency_tolerance=2)
+    controller.observe(0.01, 200)
+    controller.observe(0.05, 200)
+    assert controller.limit == 4
+
+
+def test_aimd_latency_step():
+    controller = AdaptiveConcurrency(initial=16, maximum=32)
+    for _ in range(20):
+        controller.observe(0.01, 200)
+    for _ in range(200):
+        # as if a baseline latency went by since the last decrease
+        controller.last_decrease = float("-inf")
+        controller.observe(0.03, 200)
+    # the slower API became the baseline after a few decreases, and the
+    # window grew back
+    assert controller.decreases <= 4
+    assert controller.latency == pytest.approx(0.03)
+    assert controller.limit > 16
+
+
+async def test_adaptive_update_many():
+    class Throttled(Blocks):
+        """Throttles requests above a capacity the client does not know"""
+
+        async def __call__(self, request: Request) -> Response:
+            if self.in_flight >= 6:
+                return Response(429, json={"message": "slow down"})
+            return await super().__call__(request)
+
+    handler = Throttled()
+    cli = LocalApi(handler).client()
+    controller = AdaptiveConcurrency(initial=2, maximum=32)
+    updates = {f"b{i}": dict(upstream=f"https://b{i}.test") for i in range(200)}
+    results = await cli.blocks.update_many(updates, concurrency=controller)
+    assert len(results) == 200
+    assert controller.increases and controller.decreases
+    assert controller.limit < 12
+    assert handler.peak <= 6
@@ -0,0 +1,227 @@
+import io
+import os
+import zipfile
+import zlib
+from pathlib import Path
+from typing import AsyncGenerator, cast
+
+import pytest
+from httpx2 import Request, Response
+
+from metablock.bundle import (
+    BundleStats,
+    CompressionPolicy,
+    IgnoreRules,
+    deflate,
+    deployment_hash,
+    deployment_name,
+    parse_size,
+    stream_zip,
+    tree_hash,
+    write_zip,
+)
+from metablock.upload import CHUNK_SIZE
+from tests.local import LocalApi, parts
+
+
+@pytest.fixture
+def site(tmp_path: Path) -> Path:
+    root = tmp_path / "site"
+    (root / "assets").mkdir(parents=True)
+    (root / "index.html").write_text("<html>hello</html>")
+    for index in range(4):
+        (root / "assets" / f"app{index}.js").write_bytes(os.urandom(100_000))
+    return root
+
+
+def names(data: bytes) -> set[str]:
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        assert zipf.testzip() is None
+        return {info.filename for info in zipf.infolist()}
+
+
+def contents(data: bytes) -> dict[str, bytes]:
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        return {info.filename: zipf.read(info) for info in zipf.infolist()}
+
+
+def test_write_zip_parallel(site: Path, tmp_path: Path):
+    serial, parallel = tmp_path / "serial.zip", tmp_path / "parallel.zip"
+    write_zip(site, serial)
+    write_zip(site, parallel, jobs=3)
+    assert names(parallel.read_bytes()) == names(serial.read_bytes())
+    assert contents(parallel.read_bytes()) == contents(serial.read_bytes())
+
+
+def test_write_zip_reproducible(site: Path, tmp_path: Path):
+    (site / "logo.png").write_bytes(b"\x89PNG" + bytes(1000))
+    first, second = tmp_path / "first.zip", tmp_path / "second.zip"
+    write_zip(site, first)
+    for entry in site.rglob("*"):
+        os.utime(entry, (1_000_000_000, 1_000_000_000))
+    write_zip(site, second, jobs=2)
+    assert first.read_bytes() == second.read_bytes()
+    with zipfile.ZipFile(first) as zipf:
+        assert [info.filename for info in zipf.infolist()] == [
+            *(f"assets/app{index}.js" for index in range(4)),
+            "index.html",
+            "logo.png",
+        ]
+        assert {info.date_time for info in zipf.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+
+
+def test_tree_hash(site: Path):
+    digest = tree_hash(site)
+    os.utime(site / "index.html", (1_000_000_000, 1_000_000_000))
+    assert tree_hash(site) == digest
+    (site / "index.html").write_text("<html>changed</html>")
+    changed = tree_hash(site)
+    assert changed != digest
+    (site / "index.html").chmod(0o755)
+    assert tree_hash(site) != changed
+    name = deployment_name("release 1", digest)
+    assert deployment_hash(name) == digest
+    assert deployment_hash(deployment_name("", digest)) == digest
+    assert deployment_hash("release 1") == ""
+    assert deployment_hash(None) == ""
+
+
+@pytest.mark.parametrize(
+    "name, ignored",
+    [
+        ("index.html", False),
+        (".DS_Store", True),
+        ("assets/.DS_Store", True),
+        ("assets/app.js.map", True),
+        ("assets/vendor.js.map", False),
+        ("fixtures/data.json", True),
+        ("assets/fixtures", False),
+        ("assets/fixtures/data.json", True),
+        ("docs/readme.md", True),
+        ("assets/docs/readme.md", False),
+        ("dist/app.js", True),
+        ("assets/dist/app.js", False),
+        ("top.bak", True),
+        ("assets/deep/app.bak", True),
+        ("src/app.tmp", True),
+        ("src/lib/app.tmp", False),
+        ("logs/a/b/today.log", True),
+        ("logs.log", False),
+    ],
+)
+def test_ignore_rules(name: str, ignored: bool):
+    rules = IgnoreRules(
+        (
+            *IgnoreRules().patterns,
+            "# comment",
+            "",
+            "*.map",
+            "!vendor.js.map",
+            "fixtures/",
+            "/docs/*",
+            "/dist",
+            "**/*.bak",
+            "src/*.tmp",
+            "logs/**/*.log",
+        )
+    )
+    assert rules.ignored(name) is ignored
+
+
+def test_write_zip_ignore(site: Path, tmp_path: Path):
+    (site / ".DS_Store").write_bytes(b"\0")
+    (site / "assets" / "app0.js.map").write_text("{}")
+    (site / "tests").mkdir()
+    (site / "tests" / "fixture.json").write_text("{}")
+    (site / ".metablockignore").write_text("*.map\ntests/\n")
+    target = tmp_path / "bundle.zip"
+    write_zip(site, target)
+    expected = {"index.html", *(f"assets/app{index}.js" for index in range(4))}
+    assert names(target.read_bytes()) == expected
+    write_zip(site, target, ignore=IgnoreRules.load(site, ["!*.map", "app3.js"]))
+    assert names(target.read_bytes()) == expected - {"assets/app3.js"} | {
+        "assets/app0.js.map"
+    }
+
+
+def test_deflate_in_chunks(tmp_path: Path):
+    file = tmp_path / "large.txt"
+    content = os.urandom(CHUNK_SIZE).hex().encode()
+    file.write_bytes(content)
+    deflated, crc, size, _ = deflate(file)
+    assert len(deflated) > 1
+    assert (crc, size) == (zlib.crc32(content), len(content))
+    assert zlib.decompress(b"".join(deflated), -zlib.MAX_WBITS) == content
+
+
+def test_parse_size():
+    assert parse_size("512") == 512
+    assert parse_size("800K") == 800 * 1024
+    assert parse_size("20MiB") == 20 * 1024**2
+    assert parse_size(" 1.5g ") == 3 * 1024**3 // 2
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_compression_policy(site: Path, tmp_path: Path, jobs: int):
+    (site / "logo.png").write_bytes(b"\x89PNG" + bytes(50_000))
+    (site / "icon.svg").write_text("<svg></svg>" * 1000)
+    target = tmp_path / "bundle.zip"
+    stats = write_zip(site, target, jobs, CompressionPolicy(level=1))
+    with zipfile.ZipFile(target) as zipf:
+        assert zipf.getinfo("logo.png").compress_type == zipfile.ZIP_STORED
+        assert zipf.getinfo("icon.svg").compress_type == zipfile.ZIP_DEFLATED
+        assert zipf.getinfo("index.html").compress_type == zipfile.ZIP_DEFLATED
+    assert stats.types[".png"].saved == 0
+    assert stats.types[".svg"].saved > 10_000
+    assert stats.types[".js"].files == 4
+    report = stats.report()
+    assert report[0].startswith(".svg: 1 files, 10.7 KiB -> ")
+    assert ".png: 1 files, 48.8 KiB -> 48.8 KiB, saved 0 B in " in "\n".join(report)
+
+
+def test_compression_level(site: Path, tmp_path: Path):
+    (site / "app.css").write_text("body { margin: 0 } " * 10_000 + "x" * 1000)
+    fast, small = BundleStats(), BundleStats()
+    write_zip(site, tmp_path / "fast.zip", policy=CompressionPolicy(1), stats=fast)
+    write_zip(site, tmp_path / "small.zip", policy=CompressionPolicy(9), stats=small)
+    assert small.types[".css"].compressed < fast.types[".css"].compressed
+
+
+async def test_stream_zip(site: Path):
+    chunks = [chunk async for chunk in stream_zip(site, chunk_size=16_384)]
+    assert len(chunks) > 10
+    assert names(b"".join(chunks)) == {
+        "index.html",
+        *(f"assets/app{index}.js" for index in range(4)),
+    }
+
+
+async def test_stream_zip_parallel(site: Path, tmp_path: Path):
+    write_zip(site, tmp_path / "serial.zip")
+    chunks = [chunk async for chunk in stream_zip(site, jobs=2)]
+    assert contents(b"".join(chunks)) == contents(
+        (tmp_path / "serial.zip").read_bytes()
+    )
+
+
+async def test_stream_zip_abort(site: Path):
+    stream = cast(AsyncGenerator, stream_zip(site, chunk_size=1024, buffer=1))
+    assert await stream.__anext__()
+    # closing early stops the zip thread
+    await stream.aclose()
+
+
+async def test_ship_directory(site: Path):
+    async def handler(request: Request) -> Response:
+        return Response(201, json={"id": "d1"})
+
+    api = LocalApi(handler)
+    cli = api.client()
+    await cli.blocks.ship("b1", site, name="test", env="prod")
+    request = api.requests[0]
+    assert request.headers["transfer-encoding"] == "chunked"
+    bundle = parts(request)["bundle"]
+    assert bundle.get_filename() == "site.zip"
+    assert "index.html" in names(bundle.get_content())
@@ -0,0 +1,107 @@
+from pathlib import Path
+
+from httpx2 import Request, Response
+
+from metablock import Metablock
+from metablock.cache import CacheEntry, DiskCache, MemoryCache, ResponseCache
+from tests.local import LocalApi
+
+
+class Resources:
+    """Handler serving versioned resources with ETags"""
+
+    def __init__(self) -> None:
+        self.version = 1
+
+    async def __call__(self, request: Request) -> Response:
+        etag = f'"{self.version}"'
+        if request.method != "GET":
+            self.version += 1
+            return Response(200, json={"version": self.version})
+        if request.headers.get("if-none-match") == etag:
+            return Response(304, headers={"etag": etag})
+        return Response(200, json={"version": self.version}, headers={"etag": etag})
+
+
+async def test_cache_hit():
+    api = LocalApi(Resources())
+    cli = api.client(cache=ResponseCache(ttl=60))
+    url = f"{cli.url}/spaces/mblock"
+    assert await cli.get(url) == {"version": 1}
+    assert await cli.get(url) == {"version": 1}
+    assert len(api.requests) == 1
+    assert cli.cache and cli.cache.hits == 1
+
+
+async def test_cache_revalidate():
+    api = LocalApi(Resources())
+    cli = api.client(cache=ResponseCache(ttl=0))
+    url = f"{cli.url}/spaces/mblock"
+    assert await cli.get(url) == {"version": 1}
+    assert await cli.get(url) == {"version": 1}
+    assert len(api.requests) == 2
+    assert api.requests[1].headers["if-none-match"] == '"1"'
+    assert cli.cache and cli.cache.revalidated == 1
+
+
+async def test_cache_invalidate():
+    api = LocalApi(Resources())
+    cli = api.client(cache=ResponseCache(ttl=60))
+    space = f"{cli.url}/spaces/mblock"
+    blocks = f"{cli.url}/spaces/mblock/blocks"
+    other = f"{cli.url}/spaces/other"
+    for url in (space, blocks, other):
+        await cli.get(url)
+    await cli.patch(space, json={})
+    assert cli.cache and cli.cache.invalidated == 2
+    assert await cli.get(space) == {"version": 2}
+    assert await cli.get(other) == {"version": 1}
+
+
+def test_memory_cache_lru():
+    cache = MemoryCache(max_entries=2)
+    for key in "abc":
+        cache.put(key, CacheEntry(data=key, path=f"/{key}", expires=0))
+    assert cache.get("a") is None
+    assert cache.get("b") and cache.get("c")
+
+
+def test_disk_cache(tmp_path: Path):
+    cache = DiskCache(tmp_path / "cache.db", max_entries=2)
+    entry = CacheEntry(data={"id": 1}, path="/v1/spaces/a", expires=0, etag='"1"')
+    cache.put("a", entry)
+    cache.put("b", CacheEntry(data=[], path="/v1/spaces/a/blocks", expires=0))
+    cache.put("c", CacheEntry(data=[], path="/v1/spaces_b", expires=0))
+    assert cache.get("a") is None
+    # reopening the database finds the entries left by the previous process
+    cache = DiskCache(tmp_path / "cache.db")
+    stored = cache.get("b")
+    assert stored and stored.data == []
+    assert cache.invalidate({"/v1/spaces", "/v1/spaces/a"}, "/v1/spaces/a/") == 1
+    assert cache.get("b") is None
+    assert cache.get("c")
+
+
+def test_disk_cache_reads_do_not_write(tmp_path: Path):
+    cache = DiskCache(tmp_path / "cache.db", max_entries=2)
+    cache.put("a", CacheEntry(data=1, path="/a", expires=0))
+    cache.put("b", CacheEntry(data=2, path="/b", expires=0))
+    assert cache.db
+    changes = cache.db.total_changes
+    assert cache.get("a")
+    assert cache.db.total_changes == changes
+    # the use of "a" is saved with the next write, which evicts "b" instead
+    cache.put("c", CacheEntry(data=3, path="/c", expires=0))
+    assert cache.get("a") and cache.get("b") is None
+    cache.close()
+    cache.close()
+    assert cache.db is None
+    assert cache.get("c")
+
+
+async def test_close_disk_cache(tmp_path: Path):
+    backend = DiskCache(tmp_path / "cache.db")
+    backend.put("a", CacheEntry(data=1, path="/a", expires=0))
+    cli = Metablock(auth_key="test", cache=ResponseCache(backend=backend))
+    await cli.close()
+    assert backend.db is None
@@ -3,10 +3,14 @@ import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
+import click
 import pytest
 from click.testing import CliRunner
+from httpx2 import Request, Response
 
-from metablock.cli import main
+from metablock import cli as cli_module
+from metablock.cli import _apply, _ship, apply_blocks, main
+from tests.local import SPACE, LocalApi, block, parts
 
 BUNDLE = Path(__file__).parent / "bundle"
 BLOCKS = Path(__file__).parent / "blocks"
@@ -79,8 +83,36 @@ def test_cli_apply(org_id: str, blocks: Path):
         main, ["apply", str(blocks), "--space", "mblock", "--org", org_id]
     )
     assert result.exit_code == 0
-    # created on the first run against a new interpreter, updated afterwards
-    assert result.output.rstrip().endswith(f"block {block_name('backend')}")
+    # created on the first run against a new interpreter, then updated since
+    # the manifest sets tags, which the API does not return to compare
+    name = block_name("backend")
+    lines = result.output.splitlines()
+    assert any(
+        line.startswith((f"created new block {name} in ", f"updated block {name} in "))
+        for line in lines
+    )
+    assert lines[-1].startswith("applied 1 blocks in ")
+
+
+def test_cli_plan(org_id: str, blocks: Path):
+    # a block only ever planned, never applied, is always to be created
+    planned = block_name("planned")
+    (blocks / f"{planned}.yaml").write_text("upstream: https://{{ block }}.test")
+    runner = CliRunner()
+    result = runner.invoke(
+        main, ["apply", str(blocks), "--space", "mblock", "--org", org_id, "--plan"]
+    )
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0] == "space mblock"
+    assert f"+ create block {planned}" in lines
+    assert f"    upstream: https://{planned}.test" in lines
+    # created by test_cli_apply, tags are never returned to compare
+    name = block_name("backend")
+    assert f"+ create block {name}" in lines or (
+        f"~ update block {name}" in lines and '    tags: - -> ["test"]' in lines
+    )
+    assert lines[-1].startswith("plan: ")
 
 
 def test_cli_ship(ship_block_id: str, org_id: str, bundle: Path):
@@ -102,3 +134,237 @@ def test_cli_ship(ship_block_id: str, org_id: str, bundle: Path):
     lines = result.output.splitlines()
     assert lines[0] == f"Created zip file: {bundle}.zip"
     assert lines[1] == f"shipped {bundle}.zip to test prod"
+
+
+ROUTE = dict(name="main", protocols=["https"], paths=["/test"])
+
+
+class SpaceBlocks:
+    """Handler for the blocks of one space, listed without their routes"""
+
+    def __init__(self, **blocks: dict) -> None:
+        self.blocks = blocks
+
+    async def __call__(self, request: Request) -> Response:
+        path = request.url.path.split("/")[2:]
+        if path == ["spaces", "mblock"]:
+            return Response(200, json=SPACE)
+        if path[-1] == "blocks" and request.method == "GET":
+            return Response(
+                200, json=[dict(b, routes=None) for b in self.blocks.values()]
+            )
+        if request.method == "POST":
+            fields = LocalApi.json(request)
+            if fields["name"] == "broken":
+                return Response(422, json={"message": "invalid block"})
+            self.blocks[fields["name"]] = block(fields["name"], **fields)
+            return Response(201, json=self.blocks[fields["name"]])
+        data = self.blocks[path[-1]]
+        if request.method == "PATCH":
+            fields = LocalApi.json(request)
+            routes = fields.pop("routes", None) or ()
+            data.update(fields, routes=[dict(r, id="r1") for r in routes])
+        return Response(200, json=data)
+
+
+def stored(name: str, upstream: str) -> dict:
+    return dict(block(name, upstream=upstream), routes=[dict(ROUTE, id="r1")])
+
+
+async def test_apply_blocks_skips_unchanged(capsys):
+    api = LocalApi(
+        SpaceBlocks(
+            same=stored("same", "https://same.test"),
+            stale=stored("stale", "https://old.test"),
+            tagged=stored("tagged", "https://tagged.test"),
+        )
+    )
+    manifests = [
+        ("same", dict(upstream="https://same.test", routes=[ROUTE])),
+        ("stale", dict(upstream="https://stale.test", routes=[ROUTE])),
+        # tags are not returned with the block, so they are always sent
+        ("tagged", dict(upstream="https://tagged.test", tags=["web"], routes=[ROUTE])),
+        ("new", dict(upstream="https://new.test")),
+    ]
+    async with api.client() as cli:
+        plans = await apply_blocks(cli, "mblock", manifests, concurrency=2)
+    assert [plan.action for plan in plans] == [
+        "unchanged",
+        "update",
+        "update",
+        "create",
+    ]
+    writes = [(r.method, r.url.path) for r in api.requests if r.method != "GET"]
+    assert sorted(writes) == [
+        ("PATCH", "/v1/blocks/stale"),
+        ("PATCH", "/v1/blocks/tagged"),
+        ("POST", "/v1/spaces/s1/blocks"),
+    ]
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1] == "unchanged block same"
+    assert lines[2].startswith("updated block stale in ")
+    assert lines[3].startswith("updated block tagged in ")
+    assert lines[4].startswith("created new block new in ")
+    assert lines[5].startswith("applied 4 blocks in ")
+    assert lines[5].endswith(": 1 created, 2 updated, 1 unchanged, 0 failed")
+
+
+async def test_apply_blocks_failure(capsys):
+    api = LocalApi(SpaceBlocks())
+    manifests = [("broken", dict(html=True)), ("new", dict(html=True))]
+    async with api.client() as cli:
+        plans = await apply_blocks(cli, "mblock", manifests)
+    assert plans[0].error and not plans[1].error
+    out = capsys.readouterr().out
+    assert "failed to create block broken: " in out
+    assert out.rstrip().endswith("1 created, 0 updated, 0 unchanged, 1 failed")
+
+
+async def test_apply_state(tmp_path: Path, monkeypatch, capsys):
+    api = LocalApi(SpaceBlocks())
+    monkeypatch.setattr(cli_module, "Metablock", lambda **kwargs: api.client())
+    manifests = tmp_path / "blocks"
+    manifests.mkdir()
+    # tags cannot be compared, only the state file skips the manifest of one
+    (manifests / "one.yaml").write_text("upstream: https://one.test\ntags: [web]")
+    (manifests / "two.yaml").write_text("upstream: https://two.test")
+    state = tmp_path / "state.json"
+    await _apply(str(manifests), "mblock", "test", "", False, state_path=str(state))
+    assert "2 created" in capsys.readouterr().out
+    # unchanged manifests are skipped without any request
+    sent = len(api.requests)
+    await _apply(str(manifests), "mblock", "test", "", False, state_path=str(state))
+    assert len(api.requests) == sent
+    assert capsys.readouterr().out == (
+        "skipped 2 manifests of space mblock unchanged since the last apply\n"
+    )
+    (manifests / "two.yaml").write_text("upstream: https://changed.test")
+    await _apply(str(manifests), "mblock", "test", "", False, state_path=str(state))
+    out = capsys.readouterr().out
+    assert out.startswith(
+        "skipped 1 manifests of space mblock unchanged since the last apply\n"
+    )
+    assert "updated block two in " in out
+    await _apply(
+        str(manifests), "mblock", "test", "", False, state_path=str(state), refresh=True
+    )
+    assert "0 created, 1 updated, 1 unchanged" in capsys.readouterr().out
+
+
+async def empty_spaces(request: Request) -> Response:
+    """Handler for spaces without blocks, all found but `missing`"""
+    path = request.url.path.split("/")[2:]
+    if path[1] == "missing":
+        return Response(404, json={"message": "space not found"})
+    if request.method == "POST":
+        fields = LocalApi.json(request)
+        data = block(fields["name"], **fields)
+        data["space"] = dict(SPACE, id=path[1], name=path[1])
+        return Response(201, json=data)
+    if path[-1] == "blocks":
+        return Response(200, json=[])
+    return Response(200, json=dict(SPACE, id=path[1], name=path[1]))
+
+
+async def test_apply_many_spaces(tmp_path: Path, monkeypatch, capsys):
+    api = LocalApi(empty_spaces)
+    monkeypatch.setattr(
+        cli_module, "Metablock", lambda **kwargs: api.client(org_id=kwargs["org_id"])
+    )
+    (tmp_path / "web.yaml").write_text("upstream: https://{{ space }}.test")
+    spaces = ["one,two", "o2/three"]
+    await _apply(str(tmp_path), spaces, "test", "o1", False)
+    created = {
+        (r.url.path.split("/")[3], r.headers["x-metablock-org-id"])
+        for r in api.requests
+        if r.method == "POST"
+    }
+    assert created == {("one", "o1"), ("two", "o1"), ("three", "o2")}
+    out = capsys.readouterr().out
+    assert out.count("created new block web in ") == 3
+    assert out.rstrip().splitlines()[-1].endswith(": 3 succeeded, 0 failed")
+    with pytest.raises(click.exceptions.Abort):
+        await _apply(str(tmp_path), "one,missing", "test", "o1", False)
+    out = capsys.readouterr().out
+    assert "failed to apply space missing: " in out
+    assert out.rstrip().endswith(": 1 succeeded, 1 failed")
+
+
+class Deployments:
+    """Handler for the block to ship to, listing the deployments it accepted"""
+
+    def __init__(self) -> None:
+        self.shipped: list[dict] = []
+
+    async def __call__(self, request: Request) -> Response:
+        if not request.url.path.endswith("/deployments"):
+            return Response(200, json=block("b1", name="test"))
+        if request.method == "GET":
+            env = request.url.params["env"]
+            return Response(200, json=[d for d in self.shipped if d["env"] == env])
+        fields = parts(request)
+        deployment = dict(
+            id=f"d{len(self.shipped) + 1}",
+            block_id="b1",
+            env=fields["env"].get_content(),
+            name=fields["name"].get_content(),
+            created=datetime.now(timezone.utc).isoformat(),
+            url="https://test.test",
+        )
+        self.shipped.insert(0, deployment)
+        return Response(201, json=deployment)
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+async def test_ship_report(bundle: Path, monkeypatch, capsys, pipeline: bool):
+    api = LocalApi(Deployments())
+    monkeypatch.setattr(cli_module, "Metablock", lambda **kwargs: api.client())
+    await _ship(
+        str(bundle), "prod", "b1", "test", "test", "", pipeline=pipeline, report=True
+    )
+    lines = capsys.readouterr().out.splitlines()
+    shipped = bundle if pipeline else f"{bundle}.zip"
+    assert f"shipped {shipped} to test prod" in lines
+    assert lines[-1].startswith(".html: 1 files, ")
+    assert not bundle.with_suffix(".zip").exists()
+
+
+async def test_ship_unchanged(bundle: Path, monkeypatch, capsys):
+    handler = Deployments()
+    api = LocalApi(handler)
+    monkeypatch.setattr(cli_module, "Metablock", lambda **kwargs: api.client())
+    await _ship(str(bundle), "prod", "b1", "v1", "test", "", pipeline=True)
+    assert handler.shipped[0]["name"].startswith("v1 sha256:")
+    await _ship(str(bundle), "prod", "b1", "v2", "test", "", pipeline=True)
+    out = capsys.readouterr().out
+    assert f"skipped {bundle}, unchanged since deployment d1 to test prod" in out
+    # another environment, a forced ship or a changed bundle are shipped
+    await _ship(str(bundle), "stage", "b1", "v2", "test", "", pipeline=True)
+    await _ship(str(bundle), "prod", "b1", "v3", "test", "", force=True)
+    (bundle / "index.html").write_text("<html>changed</html>")
+    await _ship(str(bundle), "prod", "b1", "v4", "test", "", pipeline=True)
+    assert [d["name"].split()[0] for d in handler.shipped] == ["v4", "v3", "v2", "v1"]
+    assert len({d["name"].split()[1] for d in handler.shipped}) == 2
+
+
+async def test_ship_size_budget(bundle: Path, monkeypatch, capsys):
+    api = LocalApi(Deployments())
+    monkeypatch.setattr(cli_module, "Metablock", lambda **kwargs: api.client())
+    (bundle / "app.js.map").write_bytes(bytes(200_000))
+    with pytest.raises(click.exceptions.Abort):
+        await _ship(str(bundle), "prod", "b1", "v1", "test", "", max_size=100_000)
+    err = capsys.readouterr().err.splitlines()
+    assert err[0].startswith(f"bundle {bundle} is 196.8 KiB, ")
+    assert err[0].endswith("over the budget of 97.7 KiB; largest files:")
+    assert err[1] == "   195.3 KiB  app.js.map"
+    assert not api.requests
+    await _ship(
+        str(bundle), "prod", "b1", "v1", "test", "", exclude=["*.map"], max_size=100_000
+    )
+    assert capsys.readouterr().out.endswith("to test prod\n")
+
+
+def test_cli_ship_max_size_error(bundle: Path):
+    result = CliRunner().invoke(main, ["ship", str(bundle), "--max-size", "lots"])
+    assert result.exit_code == 2
+    assert "invalid size 'lots'" in result.output
@@ -0,0 +1,79 @@
+import json
+from typing import AsyncIterator
+
+import pytest
+from httpx2 import Request, Response
+
+from metablock.codec import JsonCodec, get_codec, iter_json_array
+from tests.local import LocalApi
+
+
+def test_default_codec():
+    pytest.importorskip("orjson")
+    assert get_codec().name == "orjson"
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec("yaml")
+
+
+def test_roundtrip():
+    codec = get_codec()
+    data = {"name": "bläck", "tags": ["a", "b"], "html": True, "size": 1.5}
+    assert codec.loads(codec.dumps(data)) == data
+    assert json.loads(codec.dumps(data)) == data
+
+
+class Loud(JsonCodec):
+    def dumps(self, data):
+        return super().dumps({**data, "codec": "loud"})
+
+
+async def test_client_codec():
+    async def handler(request: Request) -> Response:
+        return Response(200, content=request.content)
+
+    api = LocalApi(handler)
+    cli = api.client(codec=Loud())
+    created = await cli.post(f"{cli.url}/spaces", json={"name": "x"})
+    assert created == {"name": "x", "codec": "loud"}
+    assert api.requests[0].headers["content-type"] == "application/json"
+
+
+async def chunked(body: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+@pytest.mark.parametrize("size", [1, 3, 64, 100_000])
+async def test_iter_json_array(size: int):
+    items = [{"name": 'x,]}"é', "n": [1, 2.5, None]}, -1.5e10, "s", True, [], {}]
+    body = json.dumps(items, ensure_ascii=False).encode()
+    assert [item async for item in iter_json_array(chunked(body, size))] == items
+
+
+@pytest.mark.parametrize("body", [b'{"a": 1}', b"[1, 2", b""])
+async def test_iter_json_array_invalid(body: bytes):
+    with pytest.raises(ValueError):
+        [item async for item in iter_json_array(chunked(body, 2))]
+
+
+async def test_stream_deployments():
+    items = [
+        dict(
+            id=str(index),
+            block_id="b1",
+            env="stage",
+            created="2026-01-01T00:00:00Z",
+            url=f"https://cdn.metablock.test/{index}.zip",
+        )
+        for index in range(50)
+    ]
+
+    async def handler(request: Request) -> Response:
+        return Response(200, content=chunked(json.dumps(items).encode(), 100))
+
+    cli = LocalApi(handler).client()
+    deployments = [d async for d in cli.blocks.stream_deployments("b1", env="stage")]
+    assert [d.id for d in deployments] == [item["id"] for item in items]
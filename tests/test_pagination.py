@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+from httpx2 import Request, Response
+
+from metablock.pagination import iter_pages, next_cursor
+from tests.local import LocalApi
+
+PAGES = 4
+PAGE_SIZE = 5
+
+
+def deployment(index: int) -> dict:
+    return dict(
+        id=str(index),
+        block_id="b1",
+        env="prod",
+        created="2026-01-01T00:00:00Z",
+        url=f"https://cdn.metablock.test/{index}.zip",
+    )
+
+
+async def paginated(request: Request) -> Response:
+    """Deployments paginated with the Link header, slow to respond"""
+    await asyncio.sleep(0.02)
+    page = int(request.url.params.get("cursor", "0"))
+    items = [deployment(page * PAGE_SIZE + i) for i in range(PAGE_SIZE)]
+    headers = {}
+    if page + 1 < PAGES:
+        url = request.url.copy_set_param("cursor", str(page + 1))
+        headers["link"] = f'<{url}>; rel="next"'
+    return Response(200, json=items, headers=headers)
+
+
+def test_next_cursor():
+    link = '<https://api.metablock.test/v1/extensions?cursor=abc>; rel="next"'
+    assert next_cursor(Response(200, headers={"link": link})) == "abc"
+    assert next_cursor(Response(200, headers={"x-next-cursor": "def"})) == "def"
+    assert next_cursor(Response(200)) == ""
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 3])
+async def test_iter_deployments(prefetch: int):
+    api = LocalApi(paginated)
+    cli = api.client()
+    deployments = [
+        d async for d in cli.blocks.iter_deployments("b1", limit=5, prefetch=prefetch)
+    ]
+    assert [d.id for d in deployments] == [str(i) for i in range(PAGES * PAGE_SIZE)]
+    assert len(api.requests) == PAGES
+    assert all(r.url.params["limit"] == "5" for r in api.requests)
+
+
+async def test_prefetch_overlaps_consumer():
+    async def consume(prefetch: int) -> float:
+        cli = LocalApi(paginated).client()
+        start = time.monotonic()
+        async for _ in cli.blocks.iter_deployments("b1", prefetch=prefetch):
+            await asyncio.sleep(0.004)
+        return time.monotonic() - start
+
+    # 4 pages of 20ms each, with 20ms spent consuming each page
+    assert await consume(0) >= 0.16
+    assert await consume(2) < 0.14
+
+
+async def test_iter_pages_error():
+    async def fetch(cursor):
+        if cursor:
+            raise RuntimeError("boom")
+        return [1], "next"
+
+    pages = []
+    with pytest.raises(RuntimeError):
+        async for page in iter_pages(fetch, prefetch=2):
+            pages.append(page)
+    assert pages == [[1]]
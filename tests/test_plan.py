@@ -0,0 +1,65 @@
+from metablock.plan import plan_block
+from metablock.schema import Block
+from tests.local import block
+
+ROUTE = dict(name="main", protocols=["https"], paths=["/test"])
+
+
+def current(**fields) -> Block:
+    data = block("b1", name="backend", upstream="https://backend.test")
+    data.update(routes=[dict(ROUTE, id="r1", methods=None)], **fields)
+    return Block.model_validate(data)
+
+
+def test_create():
+    plan = plan_block("backend", dict(upstream="https://backend.test"), None)
+    assert plan.action == "create"
+    assert plan.changes == []
+
+
+def test_unchanged():
+    config = dict(upstream="https://backend.test/", html=False, routes=[ROUTE])
+    plan = plan_block("backend", config, current())
+    assert plan.action == "unchanged"
+
+
+def test_field_changes():
+    config = dict(upstream="https://other.test", use_cdn=False, routes=[ROUTE])
+    plan = plan_block("backend", config, current(use_cdn=True))
+    assert plan.action == "update"
+    assert [(c.field, c.current, c.desired) for c in plan.changes] == [
+        ("upstream", "https://backend.test", "https://other.test"),
+        ("use_cdn", True, False),
+    ]
+
+
+def test_route_changes():
+    routes = [dict(ROUTE, paths=["/other"]), dict(name="api", paths=["/api"])]
+    plan = plan_block("backend", dict(routes=routes), current())
+    assert [(c.field, c.current, c.desired) for c in plan.changes[:1]] == [
+        ("routes.main.paths", ["/test"], ["/other"])
+    ]
+    assert plan.changes[1].field == "routes.api"
+    assert plan.changes[1].current is None
+
+
+def test_route_removed():
+    plan = plan_block("backend", dict(routes=[]), current())
+    assert [(c.field, c.desired) for c in plan.changes] == [("routes.main", None)]
+
+
+def test_unknown_fields_change():
+    # tags are not returned with the block, routes are missing from the list
+    data = block("b1", name="backend")
+    plan = plan_block(
+        "backend", dict(tags=["test"], routes=[ROUTE]), Block.model_validate(data)
+    )
+    assert [(c.field, c.current) for c in plan.changes] == [
+        ("tags", None),
+        ("routes", None),
+    ]
+    assert not plan.in_sync
+    plan.applied = plan.block
+    assert plan.in_sync
+    plan = plan_block("backend", dict(upstream=""), Block.model_validate(data))
+    assert plan.action == "unchanged" and plan.in_sync
@@ -0,0 +1,78 @@
+import gzip
+import zipfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from metablock import precompress as precompress_module
+from metablock.bundle import BundleStats, tree_hash, write_zip
+from metablock.precompress import Precompress
+
+SCRIPT = "export function hello(name) { return `hello ${name}`; }\n" * 200
+
+
+@pytest.fixture
+def site(tmp_path: Path) -> Path:
+    root = tmp_path / "site"
+    (root / "assets").mkdir(parents=True)
+    (root / "index.html").write_text("<html>hello</html>")
+    (root / "assets" / "app.js").write_text(SCRIPT)
+    (root / "assets" / "app.css").write_text("body { margin: 0; }\n" * 200)
+    (root / "assets" / "logo.png").write_bytes(b"\x89PNG" + bytes(5000))
+    return root
+
+
+def test_variants(site: Path):
+    precompress = Precompress(brotli=False)
+    script = site / "assets" / "app.js"
+    [(suffix, data, seconds)] = precompress.variants(script)
+    assert suffix == ".gz"
+    assert gzip.decompress(data) == script.read_bytes()
+    # no timestamp, the same file always compresses to the same bytes
+    assert precompress.variants(script)[0][1] == data
+    assert precompress.variants(site / "index.html") == []
+    assert precompress.variants(site / "assets" / "logo.png") == []
+    (site / "assets" / "app.js.gz").write_bytes(data)
+    assert precompress.variants(script) == []
+
+
+def test_brotli_when_installed(site: Path, monkeypatch):
+    monkeypatch.setattr(precompress_module, "brotli_module", lambda: None)
+    assert Precompress().encodings == (".gz",)
+    brotli = SimpleNamespace(compress=lambda data, quality: b"br%d" % quality)
+    monkeypatch.setattr(precompress_module, "brotli_module", lambda: brotli)
+    assert Precompress().encodings == (".br", ".gz")
+    assert Precompress(brotli=False).encodings == (".gz",)
+    variants = Precompress().variants(site / "assets" / "app.js")
+    assert [(suffix, data) for suffix, data, _ in variants][0] == (".br", b"br11")
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_write_zip_precompress(site: Path, tmp_path: Path, jobs: int):
+    serial, target = tmp_path / "serial.zip", tmp_path / "bundle.zip"
+    precompress = Precompress(brotli=False)
+    write_zip(site, serial, precompress=precompress)
+    stats = write_zip(site, target, jobs, precompress=precompress, stats=BundleStats())
+    assert target.read_bytes() == serial.read_bytes()
+    with zipfile.ZipFile(target) as zipf:
+        assert zipf.namelist() == [
+            "assets/app.css",
+            "assets/app.css.gz",
+            "assets/app.js",
+            "assets/app.js.gz",
+            "assets/logo.png",
+            "index.html",
+        ]
+        variant = zipf.getinfo("assets/app.js.gz")
+        assert variant.compress_type == zipfile.ZIP_STORED
+        assert gzip.decompress(zipf.read(variant)) == SCRIPT.encode()
+    assert stats.types[".gz"].files == 2
+
+
+def test_tree_hash_precompress(site: Path):
+    digest = tree_hash(site)
+    assert tree_hash(site, precompress=Precompress()) != digest
+    assert tree_hash(site, precompress=Precompress(min_size=10)) != tree_hash(
+        site, precompress=Precompress()
+    )
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from collections import Counter
+
+from httpx2 import Request, Response
+
+from metablock.ratelimit import RateLimiter, TokenBucket
+from metablock.retry import RetryPolicy
+from tests.local import LocalApi
+
+
+class InFlight:
+    """Handler recording the peak number of concurrent requests per org"""
+
+    def __init__(self) -> None:
+        self.current: Counter = Counter()
+        self.peak: Counter = Counter()
+
+    async def __call__(self, request: Request) -> Response:
+        org_id = request.headers.get("x-metablock-org-id", "")
+        self.current[org_id] += 1
+        self.peak[org_id] = max(self.peak[org_id], self.current[org_id])
+        await asyncio.sleep(0.01)
+        self.current[org_id] -= 1
+        return Response(200, json={})
+
+
+async def test_token_bucket():
+    bucket = TokenBucket(rate=100, burst=2)
+    start = time.monotonic()
+    for _ in range(6):
+        await bucket.acquire()
+    # two tokens from the burst, four refilled at 100 per second
+    assert time.monotonic() - start >= 0.035
+
+
+async def test_max_in_flight_per_org():
+    handler = InFlight()
+    api = LocalApi(handler)
+    cli = api.client(rate_limit=RateLimiter(max_in_flight=3), single_flight=None)
+    await asyncio.gather(
+        *(
+            cli.get(f"{cli.url}/spaces", headers={cli.org_id_name: org_id})
+            for org_id in ("a", "b") * 10
+        )
+    )
+    assert handler.peak == {"a": 3, "b": 3}
+    assert cli.rate_limit and cli.rate_limit.throttled
+
+
+async def test_pause_on_429():
+    async def handler(request: Request) -> Response:
+        if len(api.requests) == 1:
+            return Response(429, headers={"retry-after": "0.05"})
+        return Response(200, json={})
+
+    api = LocalApi(handler)
+    # the retry itself does not wait, the pause of the org bucket does
+    retry = RetryPolicy(backoff=0, retry_after=False)
+    cli = api.client(rate_limit=RateLimiter(rate=1000), retry=retry)
+    start = time.monotonic()
+    await cli.get(f"{cli.url}/spaces")
+    assert len(api.requests) == 2
+    assert time.monotonic() - start >= 0.05
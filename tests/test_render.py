@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from metablock.render import load_manifests
+
+BLOCKS = Path(__file__).parent / "blocks"
+
+
+def items(tmp_path: Path, count: int) -> list:
+    text = (BLOCKS / "backend.yaml").read_text()
+    paths = []
+    for index in range(count):
+        path = tmp_path / f"block{index}.yaml"
+        path.write_text(text)
+        paths.append((path, dict(space="mblock", block=path.stem)))
+    return paths
+
+
+def test_load_manifests(tmp_path: Path):
+    loaded = load_manifests(items(tmp_path, 3), jobs=1)
+    text, config = loaded[2]
+    assert "https://block2.test" in text
+    assert config["upstream"] == "https://block2.test"
+    assert config["routes"][0]["tags"] == ["mblock", "block2"]
+
+
+def test_load_manifests_pool(tmp_path: Path):
+    manifests = items(tmp_path, 6)
+    assert load_manifests(manifests, jobs=2) == load_manifests(manifests, jobs=1)
+
+
+def test_render_only(tmp_path: Path):
+    [(text, config)] = load_manifests(items(tmp_path, 1), parse=False)
+    assert text.startswith("upstream: https://block0.test")
+    assert config is None
@@ -0,0 +1,75 @@
+import pytest
+from httpx2 import ConnectError, ReadTimeout, Request, Response
+
+from metablock import MetablockResponseError
+from metablock.retry import RetryPolicy, parse_retry_after
+from tests.local import LocalApi
+
+NO_WAIT = RetryPolicy(backoff=0, jitter=False)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("-1") == 0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_backoff():
+    policy = RetryPolicy(backoff=1, backoff_max=5, jitter=False)
+    assert [policy.delay(attempt) for attempt in range(1, 5)] == [1, 2, 4, 5]
+    assert 0 <= RetryPolicy(backoff=1).delay(3) <= 4
+    response = Response(429, headers={"retry-after": "2"})
+    assert policy.delay(1, response) == 2
+
+
+async def test_retry_status():
+    async def handler(request: Request) -> Response:
+        if len(api.requests) < 3:
+            return Response(503, json={"message": "unavailable"})
+        return Response(200, json={"id": "1"})
+
+    api = LocalApi(handler)
+    cli = api.client(retry=NO_WAIT)
+    assert await cli.get(f"{cli.url}/spaces/1") == {"id": "1"}
+    assert cli.retry_stats.attempts == 3
+    assert cli.retry_stats.retries == 2
+    assert cli.retry_stats.statuses == {503: 2}
+    assert cli.retry_stats.amplification == 3
+
+
+async def test_retry_exhausted():
+    async def handler(request: Request) -> Response:
+        return Response(429, json={"message": "slow down"})
+
+    api = LocalApi(handler)
+    cli = api.client(retry=NO_WAIT)
+    with pytest.raises(MetablockResponseError) as exc:
+        await cli.get(f"{cli.url}/spaces")
+    assert exc.value.status == 429
+    assert len(api.requests) == 3
+    assert cli.retry_stats.exhausted == 1
+
+
+async def test_no_retry_post():
+    async def handler(request: Request) -> Response:
+        raise ReadTimeout("timeout", request=request)
+
+    api = LocalApi(handler)
+    cli = api.client(retry=NO_WAIT)
+    with pytest.raises(ReadTimeout):
+        await cli.post(f"{cli.url}/spaces", json={})
+    assert len(api.requests) == 1
+
+
+async def test_retry_connect_error_post():
+    async def handler(request: Request) -> Response:
+        if len(api.requests) == 1:
+            raise ConnectError("refused", request=request)
+        return Response(201, json={"id": "1"})
+
+    api = LocalApi(handler)
+    cli = api.client(retry=NO_WAIT)
+    assert await cli.post(f"{cli.url}/spaces", json={}) == {"id": "1"}
+    assert cli.retry_stats.errors == {"ConnectError": 1}
@@ -0,0 +1,61 @@
+import asyncio
+
+from httpx2 import Request, Response
+
+from metablock.singleflight import SingleFlight
+from tests.local import LocalApi
+
+
+async def slow_space(request: Request) -> Response:
+    await asyncio.sleep(0.01)
+    return Response(200, json={"id": "1", "name": request.url.path})
+
+
+async def test_identical_gets_share_request():
+    api = LocalApi(slow_space)
+    cli = api.client()
+    url = f"{cli.url}/spaces/mblock"
+    results = await asyncio.gather(*(cli.get(url) for _ in range(10)))
+    assert len(api.requests) == 1
+    assert all(result == results[0] for result in results)
+    assert cli.single_flight and cli.single_flight.shared == 9
+    # completed calls are forgotten, the next call goes to the API again
+    await cli.get(url)
+    assert len(api.requests) == 2
+
+
+async def test_different_requests_not_shared():
+    api = LocalApi(slow_space)
+    cli = api.client()
+    url = f"{cli.url}/spaces/mblock/blocks"
+    await asyncio.gather(
+        cli.get(url),
+        cli.get(url, params={"html": True}),
+        cli.get(url, headers={cli.org_id_name: "other"}),
+        cli.get(url, timeout=1),
+        cli.patch(url, json={}),
+    )
+    assert len(api.requests) == 5
+
+
+async def test_disabled():
+    api = LocalApi(slow_space)
+    cli = api.client(single_flight=None)
+    url = f"{cli.url}/spaces/mblock"
+    await asyncio.gather(cli.get(url), cli.get(url))
+    assert len(api.requests) == 2
+
+
+async def test_cancelled_caller_does_not_cancel_others():
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        return 1
+
+    first = asyncio.ensure_future(flight.run("key", call))
+    second = asyncio.ensure_future(flight.run("key", call))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == 1
+    assert not flight.calls
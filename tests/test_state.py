@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from metablock.state import ApplyState, manifest_hash
+
+
+def test_state_roundtrip(tmp_path: Path):
+    path = tmp_path / "state.json"
+    state = ApplyState.load(path)
+    assert state.spaces == {}
+    digest = manifest_hash("upstream: https://backend.test")
+    state.record("mblock", "backend", digest, "b1")
+    state.save()
+    loaded = ApplyState.load(path)
+    assert loaded.unchanged("mblock", "backend", digest)
+    assert not loaded.unchanged("mblock", "backend", manifest_hash("html: true"))
+    assert not loaded.unchanged("other", "backend", digest)
+    loaded.forget("mblock", "backend")
+    assert not loaded.unchanged("mblock", "backend", digest)
+
+
+def test_state_unreadable(tmp_path: Path):
+    path = tmp_path / "state.json"
+    path.write_text("not json")
+    assert ApplyState.load(path).spaces == {}
+    path.write_text('{"version": 0, "spaces": {"mblock": {}}}')
+    assert ApplyState.load(path).spaces == {}
@@ -0,0 +1,28 @@
+import asyncio
+
+from metablock import Metablock
+from metablock.transport import TransportConfig
+
+
+def test_pool_limits():
+    config = TransportConfig(max_connections=10, max_keepalive_connections=20)
+    assert config.limits.max_connections == 10
+    # keep-alive connections never exceed the pool they are drawn from
+    assert config.limits.max_keepalive_connections == 10
+    assert config.host_pool_limits(None).max_keepalive_connections == 20
+
+
+async def test_session_created_once():
+    cli = Metablock(transport=TransportConfig(max_connections=4))
+
+    async def session():
+        await asyncio.sleep(0)
+        return cli.get_session()
+
+    try:
+        sessions = await asyncio.gather(*(session() for _ in range(20)))
+        assert all(s is sessions[0] for s in sessions)
+        assert cli.session_owner
+    finally:
+        await cli.close()
+    assert cli.session is None
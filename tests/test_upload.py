@@ -0,0 +1,192 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+from httpx2 import ConnectError, ReadError, Request, Response
+
+from metablock.components import MetablockResponseError
+from metablock.retry import RetryPolicy
+from metablock.upload import MultipartBody, content_range
+from tests.local import LocalApi, parts
+
+
+async def test_multipart_body(tmp_path: Path):
+    path = tmp_path / "bundle.zip"
+    path.write_bytes(bytes(range(256)) * 100)
+    body = MultipartBody.from_file(path, fields=dict(env="prod"), chunk_size=1000)
+    chunks = [chunk async for chunk in body]
+    # the head, the file in chunks and the tail
+    assert len(chunks) == 28
+    assert int(body.headers["content-length"]) == sum(map(len, chunks))
+    # iterating again reads the file from the start
+    assert [chunk async for chunk in body] == chunks
+
+
+async def test_ship_streams_bundle(tmp_path: Path):
+    async def handler(request: Request) -> Response:
+        if len(api.requests) == 1:
+            raise ConnectError("connection refused")
+        return Response(201, json={"id": "d1"})
+
+    path = tmp_path / "bundle.zip"
+    path.write_bytes(b"PK" + bytes(range(256)) * 4000)
+    api = LocalApi(handler)
+    cli = api.client(retry=RetryPolicy(backoff=0, jitter=False))
+    assert await cli.blocks.ship("b1", path, name="test", env="prod") == {"id": "d1"}
+    # the body is sent again whole when retried
+    request = api.requests[-1]
+    assert int(request.headers["content-length"]) == len(request.content)
+    fields = parts(request)
+    assert fields["name"].get_content() == "test"
+    assert fields["env"].get_content() == "prod"
+    bundle = fields["bundle"]
+    assert bundle.get_filename() == "bundle.zip"
+    assert bundle.get_content_type() == "application/zip"
+    assert bundle.get_content() == path.read_bytes()
+
+
+class ResumableUploads:
+    """Stand-in for the chunked upload endpoints `Blocks.ship_chunked` expects
+
+    The live API does not provide them yet, so the client is only tested here.
+
+    `faults` maps the index of a PUT to what goes wrong with it: `cut` drops
+    the connection halfway through the chunk, `lost` drops it after the
+    whole chunk is stored, and a status is returned without storing anything.
+    """
+
+    def __init__(self, faults: dict[int, str | int] | None = None) -> None:
+        self.faults = faults or {}
+        self.uploads: dict[str, dict] = {}
+        self.puts: list[str] = []
+
+    async def __call__(self, request: Request) -> Response:
+        upload_id = request.url.path.partition("/uploads")[2].strip("/")
+        if request.method == "POST":
+            upload_id = f"u{len(self.uploads) + 1}"
+            self.uploads[upload_id] = dict(LocalApi.json(request), data=bytearray())
+            return Response(201, json=dict(id=upload_id, offset=0))
+        upload = self.uploads[upload_id]
+        data = upload["data"]
+        if request.method == "GET":
+            return Response(200, json=dict(id=upload_id, offset=len(data)))
+        content_range = request.headers["content-range"]
+        self.puts.append(content_range)
+        fault = self.faults.get(len(self.puts))
+        if isinstance(fault, int):
+            return Response(fault, json=dict(message="try again"))
+        start = content_range.split()[1].partition("-")[0]
+        if start != "*/" + str(upload["size"]) and int(start) != len(data):
+            return Response(409, json=dict(offset=len(data)))
+        chunk = request.content
+        if fault == "cut":
+            data += chunk[: len(chunk) // 2]
+            raise ReadError("connection reset")
+        data += chunk
+        if fault == "lost":
+            raise ReadError("connection reset")
+        if len(data) < upload["size"]:
+            return Response(200, json=dict(id=upload_id, offset=len(data)))
+        return Response(201, json=dict(id="d1", name=upload["name"]))
+
+
+@pytest.fixture
+def bundle(tmp_path: Path) -> Path:
+    path = tmp_path / "bundle.zip"
+    path.write_bytes(bytes(range(256)) * 40)
+    return path
+
+
+def uploads_client(handler: ResumableUploads) -> tuple[LocalApi, Any]:
+    api = LocalApi(handler)
+    return api, api.client(retry=RetryPolicy(backoff=0, jitter=False))
+
+
+def test_content_range():
+    assert content_range(0, 3000, 10240) == "bytes 0-2999/10240"
+    assert content_range(9000, 1240, 10240) == "bytes 9000-10239/10240"
+    assert content_range(10240, 0, 10240) == "bytes */10240"
+
+
+async def test_ship_chunked(bundle: Path):
+    server = ResumableUploads()
+    _, cli = uploads_client(server)
+    deployment = await cli.blocks.ship_chunked(
+        "b1", bundle, name="test", env="prod", chunk_size=3000
+    )
+    assert deployment == dict(id="d1", name="test")
+    assert server.puts == [
+        "bytes 0-2999/10240",
+        "bytes 3000-5999/10240",
+        "bytes 6000-8999/10240",
+        "bytes 9000-10239/10240",
+    ]
+    upload = server.uploads["u1"]
+    assert upload["data"] == bundle.read_bytes()
+    assert (upload["env"], upload["filename"]) == ("prod", "bundle.zip")
+
+
+async def test_ship_chunked_resumes(bundle: Path):
+    server = ResumableUploads({2: "cut", 5: 503})
+    api, cli = uploads_client(server)
+    await cli.blocks.ship_chunked("b1", bundle, name="test", chunk_size=3000)
+    assert server.uploads["u1"]["data"] == bundle.read_bytes()
+    assert server.puts == [
+        "bytes 0-2999/10240",
+        # cut halfway, retried and refused as the server has half of it
+        "bytes 3000-5999/10240",
+        "bytes 3000-5999/10240",
+        # resumed from the offset of the server
+        "bytes 4500-7499/10240",
+        # busy, retried as it is
+        "bytes 7500-10239/10240",
+        "bytes 7500-10239/10240",
+    ]
+    assert [r.method for r in api.requests].count("GET") == 1
+
+
+async def test_ship_chunked_last_chunk_lost(bundle: Path):
+    server = ResumableUploads({2: "lost"})
+    _, cli = uploads_client(server)
+    deployment = await cli.blocks.ship_chunked("b1", bundle, chunk_size=6000)
+    assert deployment["id"] == "d1"
+    # the server has all of it, an empty chunk completes the upload
+    assert server.puts[-1] == "bytes */10240"
+    assert server.uploads["u1"]["data"] == bundle.read_bytes()
+
+
+async def test_ship_chunked_upload_id(bundle: Path):
+    server = ResumableUploads()
+    content = bundle.read_bytes()
+    server.uploads["u7"] = dict(
+        name="test", size=len(content), data=bytearray(content[:5000])
+    )
+    api, cli = uploads_client(server)
+    await cli.blocks.ship_chunked("b1", bundle, upload_id="u7", chunk_size=4000)
+    assert "POST" not in {r.method for r in api.requests}
+    assert server.puts == ["bytes 5000-8999/10240", "bytes 9000-10239/10240"]
+    assert server.uploads["u7"]["data"] == content
+
+
+async def test_ship_chunked_gives_up(bundle: Path):
+    server = ResumableUploads({index: 503 for index in range(1, 20)})
+    api, cli = uploads_client(server)
+    with pytest.raises(MetablockResponseError) as exc:
+        await cli.blocks.ship_chunked("b1", bundle, chunk_size=3000, max_resumes=1)
+    assert exc.value.status == 503
+    # three attempts, then one resume of three more
+    assert len(server.puts) == 6
+    server = ResumableUploads({1: 400})
+    api, cli = uploads_client(server)
+    with pytest.raises(MetablockResponseError):
+        await cli.blocks.ship_chunked("b1", bundle, chunk_size=3000)
+    assert [r.method for r in api.requests] == ["POST", "PUT"]
+    # a server acknowledging chunks it then loses cannot keep it going forever
+    server = ResumableUploads()
+    server.uploads["u1"] = dict(name="test", size=10240, data=b"")
+    api, cli = uploads_client(server)
+    with pytest.raises(MetablockResponseError) as exc:
+        await cli.blocks.ship_chunked(
+            "b1", bundle, upload_id="u1", chunk_size=3000, max_resumes=2
+        )
+    assert exc.value.status == 409